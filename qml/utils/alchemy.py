@@ -23,240 +23,33 @@
 from __future__ import division
 from __future__ import print_function
 
+import math
+import functools
 import numpy as np
-from copy import copy
-
-ELEMENT_NAME = {
-    1:  'H'  , 
-    2:  'He' , 
-    3:  'Li' , 
-    4:  'Be' , 
-    5:  'B'  , 
-    6:  'C'  , 
-    7:  'N'  , 
-    8:  'O'  , 
-    9:  'F'  , 
-   10:  'Ne' , 
-   11:  'Na' , 
-   12:  'Mg' , 
-   13:  'Al' , 
-   14:  'Si' , 
-   15:  'P'  , 
-   16:  'S'  , 
-   17:  'Cl' , 
-   18:  'Ar' , 
-   19:  'K'  , 
-   20:  'Ca' , 
-   21:  'Sc' , 
-   22:  'Ti' , 
-   23:  'V'  , 
-   24:  'Cr' , 
-   25:  'Mn' , 
-   26:  'Fe' , 
-   27:  'Co' , 
-   28:  'Ni' , 
-   29:  'Cu' , 
-   30:  'Zn' , 
-   31:  'Ga' , 
-   32:  'Ge' , 
-   33:  'As' , 
-   34:  'Se' , 
-   35:  'Br' , 
-   36:  'Kr' , 
-   37:  'Rb' , 
-   38:  'Sr' , 
-   39:  'Y'  , 
-   40:  'Zr' , 
-   41:  'Nb' , 
-   42:  'Mo' , 
-   43:  'Tc' , 
-   44:  'Ru' , 
-   45:  'Rh' , 
-   46:  'Pd' , 
-   47:  'Ag' , 
-   48:  'Cd' , 
-   49:  'In' , 
-   50:  'Sn' , 
-   51:  'Sb' , 
-   52:  'Te' , 
-   53:  'I'  , 
-   54:  'Xe' , 
-   55:  'Cs' , 
-   56:  'Ba' , 
-   57:  'La' , 
-   58:  'Ce' , 
-   59:  'Pr' , 
-   60:  'Nd' , 
-   61:  'Pm' , 
-   62:  'Sm' , 
-   63:  'Eu' , 
-   64:  'Gd' , 
-   65:  'Tb' , 
-   66:  'Dy' , 
-   67:  'Ho' , 
-   68:  'Er' , 
-   69:  'Tm' , 
-   70:  'Yb' , 
-   71:  'Lu' , 
-   72:  'Hf' , 
-   73:  'Ta' , 
-   74:  'W'  , 
-   75:  'Re' , 
-   76:  'Os' , 
-   77:  'Ir' , 
-   78:  'Pt' , 
-   79:  'Au' , 
-   80:  'Hg' , 
-   81:  'Tl' , 
-   82:  'Pb' , 
-   83:  'Bi' , 
-   84:  'Po' , 
-   85:  'At' , 
-   86:  'Rn' , 
-   87:  'Fr' , 
-   88:  'Ra' , 
-   89:  'Ac' , 
-   90:  'Th' , 
-   91:  'Pa' , 
-   92:  'U'  , 
-   93:  'Np' , 
-   94:  'Pu' , 
-   95:  'Am' , 
-   96:  'Cm' , 
-   97:  'Bk' , 
-   98:  'Cf' , 
-   99:  'Es' , 
-  100:  'Fm' , 
-  101:  'Md' , 
-  102:  'No' , 
-  103:  'Lr' , 
-  104:  'Rf' , 
-  105:  'Db' , 
-  106:  'Sg' , 
-  107:  'Bh' , 
-  108:  'Hs' , 
-  109:  'Mt' , 
-  110:  'Ds' , 
-  111:  'Rg' , 
-  112:  'Cn' , 
-  114:  'Uuq', 
-  116:  'Uuh'}
-
-NUCLEAR_CHARGE = {
- 'H'  :     1, 
- 'He' :     2, 
- 'Li' :     3, 
- 'Be' :     4, 
- 'B'  :     5, 
- 'C'  :     6, 
- 'N'  :     7, 
- 'O'  :     8, 
- 'F'  :     9, 
- 'Ne' :    10, 
- 'Na' :    11, 
- 'Mg' :    12, 
- 'Al' :    13, 
- 'Si' :    14, 
- 'P'  :    15, 
- 'S'  :    16, 
- 'Cl' :    17, 
- 'Ar' :    18, 
- 'K'  :    19, 
- 'Ca' :    20, 
- 'Sc' :    21, 
- 'Ti' :    22, 
- 'V'  :    23, 
- 'Cr' :    24, 
- 'Mn' :    25, 
- 'Fe' :    26, 
- 'Co' :    27, 
- 'Ni' :    28, 
- 'Cu' :    29, 
- 'Zn' :    30, 
- 'Ga' :    31, 
- 'Ge' :    32, 
- 'As' :    33, 
- 'Se' :    34, 
- 'Br' :    35, 
- 'Kr' :    36, 
- 'Rb' :    37, 
- 'Sr' :    38, 
- 'Y'  :    39, 
- 'Zr' :    40, 
- 'Nb' :    41, 
- 'Mo' :    42, 
- 'Tc' :    43, 
- 'Ru' :    44, 
- 'Rh' :    45, 
- 'Pd' :    46, 
- 'Ag' :    47, 
- 'Cd' :    48, 
- 'In' :    49, 
- 'Sn' :    50, 
- 'Sb' :    51, 
- 'Te' :    52, 
- 'I'  :    53, 
- 'Xe' :    54, 
- 'Cs' :    55, 
- 'Ba' :    56, 
- 'La' :    57, 
- 'Ce' :    58, 
- 'Pr' :    59, 
- 'Nd' :    60, 
- 'Pm' :    61, 
- 'Sm' :    62, 
- 'Eu' :    63, 
- 'Gd' :    64, 
- 'Tb' :    65, 
- 'Dy' :    66, 
- 'Ho' :    67, 
- 'Er' :    68, 
- 'Tm' :    69, 
- 'Yb' :    70, 
- 'Lu' :    71, 
- 'Hf' :    72, 
- 'Ta' :    73, 
- 'W'  :    74, 
- 'Re' :    75, 
- 'Os' :    76, 
- 'Ir' :    77, 
- 'Pt' :    78, 
- 'Au' :    79, 
- 'Hg' :    80, 
- 'Tl' :    81, 
- 'Pb' :    82, 
- 'Bi' :    83, 
- 'Po' :    84, 
- 'At' :    85, 
- 'Rn' :    86, 
- 'Fr' :    87, 
- 'Ra' :    88, 
- 'Ac' :    89, 
- 'Th' :    90, 
- 'Pa' :    91, 
- 'U'  :    92, 
- 'Np' :    93, 
- 'Pu' :    94, 
- 'Am' :    95, 
- 'Cm' :    96, 
- 'Bk' :    97, 
- 'Cf' :    98, 
- 'Es' :    99, 
- 'Fm' :   100, 
- 'Md' :   101, 
- 'No' :   102, 
- 'Lr' :   103, 
- 'Rf' :   104, 
- 'Db' :   105, 
- 'Sg' :   106, 
- 'Bh' :   107, 
- 'Hs' :   108, 
- 'Mt' :   109, 
- 'Ds' :   110, 
- 'Rg' :   111, 
- 'Cn' :   112, 
- 'Uuq':   114, 
- 'Uuh':   116}
+
+# Element symbols indexed by nuclear charge. None marks unused entries.
+SYMBOLS = (
+    None,
+    'H',   'He',  'Li',  'Be',  'B',   'C',   'N',   'O',   'F',   'Ne',  # 1-10
+    'Na',  'Mg',  'Al',  'Si',  'P',   'S',   'Cl',  'Ar',  'K',   'Ca',  # 11-20
+    'Sc',  'Ti',  'V',   'Cr',  'Mn',  'Fe',  'Co',  'Ni',  'Cu',  'Zn',  # 21-30
+    'Ga',  'Ge',  'As',  'Se',  'Br',  'Kr',  'Rb',  'Sr',  'Y',   'Zr',  # 31-40
+    'Nb',  'Mo',  'Tc',  'Ru',  'Rh',  'Pd',  'Ag',  'Cd',  'In',  'Sn',  # 41-50
+    'Sb',  'Te',  'I',   'Xe',  'Cs',  'Ba',  'La',  'Ce',  'Pr',  'Nd',  # 51-60
+    'Pm',  'Sm',  'Eu',  'Gd',  'Tb',  'Dy',  'Ho',  'Er',  'Tm',  'Yb',  # 61-70
+    'Lu',  'Hf',  'Ta',  'W',   'Re',  'Os',  'Ir',  'Pt',  'Au',  'Hg',  # 71-80
+    'Tl',  'Pb',  'Bi',  'Po',  'At',  'Rn',  'Fr',  'Ra',  'Ac',  'Th',  # 81-90
+    'Pa',  'U',   'Np',  'Pu',  'Am',  'Cm',  'Bk',  'Cf',  'Es',  'Fm',  # 91-100
+    'Md',  'No',  'Lr',  'Rf',  'Db',  'Sg',  'Bh',  'Hs',  'Mt',  'Ds',  # 101-110
+    'Rg',  'Cn',  None,  'Uuq', None,  'Uuh',  # 111-116
+    )
+
+ELEMENT_NAME = dict((z, symbol) for z, symbol in enumerate(SYMBOLS) if symbol is not None)
+
+NUCLEAR_CHARGE = dict((symbol, z) for z, symbol in ELEMENT_NAME.items())
+
+# Array version of SYMBOLS for vectorized lookups, e.g. ELEMENT_SYMBOLS[nuclear_charges]
+ELEMENT_SYMBOLS = np.array([symbol if symbol is not None else '' for symbol in SYMBOLS])
 
 # Periodic table indexes
 PTP = {
@@ -284,7 +77,7 @@ PTP = {
         ,87 :[7,1] ,88: [7,2]#Row7\
         ,113:[7,3] ,114:[7,4] ,115:[7,5] ,116:[7,6] ,117:[7,7] ,118:[7,8]\
                ,104:[7,10],105:[7,11],106:[7,12],107:[7,13],108:[7,14],109:[7,15],110:[7,16],111:[7,17],112:[7,18]\
-        ,89 :[7,19],90: [7,20],91 :[7,21],92 :[7,22],93 :[7,23],94 :[7,24],95 :[7,25],96 :[7,26],97 :[7,27],98 :[7,28],99 :[7,29],100:[7,30],101:[7,31],101:[7,32],102:[7,14],103:[7,33]}
+        ,89 :[7,19],90: [7,20],91 :[7,21],92 :[7,22],93 :[7,23],94 :[7,24],95 :[7,25],96 :[7,26],97 :[7,27],98 :[7,28],99 :[7,29],100:[7,30],101:[7,31],102:[7,32],103:[7,33]}
 
 QtNm = {
     #Row1
@@ -308,11 +101,11 @@ QtNm = {
     ,16 :[3,-1,1,-1./2.]  ,17 :[3,0,1,-1./2.]  ,18 :[3,1,1,-1./2.]
 
 
-    #Row3
+    #Row4
     ,19 :[4,0,0,1./2.]
     ,20: [4,0,0,-1./2.]
 
-    ,31 :[4,-1,2,1./2.] , 32: [4,0,1,1./2.]  , 33 :[4,1,1,1./2.]
+    ,31 :[4,-1,1,1./2.] , 32: [4,0,1,1./2.]  , 33 :[4,1,1,1./2.]
     ,34 :[4,-1,1,-1./2.] ,35 :[4,0,1,-1./2.] ,36 :[4,1,1,-1./2.]
 
     ,21 :[4,-2,2,1./2.],  22:[4,-1,2,1./2.],  23 :[4,0,2,1./2.], 24 :[4,1,2,1./2.], 25 :[4,2,2,1./2.]
@@ -358,6 +151,42 @@ QtNm = {
     ,89 :[7,-3,3,1./2.], 90: [7,-2,3,1./2.],  91 :[7,-1,3,1./2.], 92 :[7,0,3,1./2.],  93 :[7,1,3,1./2.],  94 :[7,2,3,1./2.],  95 :[7,3,3,1./2.]
     ,96 :[7,-3,3,-1./2.],97 :[7,-2,3,-1./2.],98 :[7,-1,3,-1./2.],99 :[7,0,3,-1./2.],100:[7,1,3,-1./2.],101:[7,2,3,-1./2.],102:[7,3,3,-1./2.]}
 
+MAX_Z = max(PTP)
+
+# Dense versions of PTP and QtNm indexed directly by nuclear charge.
+# Row 0 is unused padding, so e.g. PTP_ARR[6] holds [row, column] of carbon.
+PTP_ARR = np.zeros((MAX_Z + 1, 2), dtype=np.int8)
+for _z, _v in PTP.items():
+    PTP_ARR[_z] = _v
+
+QTNM_ARR = np.zeros((MAX_Z + 1, 4), dtype=np.float64)
+for _z, _v in QtNm.items():
+    QTNM_ARR[_z] = _v
+
+del _z, _v
+
+def _check_table(name, table, table_arr):
+    """ Raises a ValueError naming the first element that is missing from a table,
+        or that has the same entry as another element. Duplicate dict keys and
+        copy-paste errors in the tables above would otherwise go unnoticed.
+    """
+
+    seen = {}
+
+    for z in range(1, MAX_Z + 1):
+
+        if z not in table:
+            raise ValueError("Element %d is missing from %s" % (z, name))
+
+        entry = tuple(table_arr[z].tolist())
+
+        if entry in seen:
+            raise ValueError("Elements %d and %d have the same entry %s in %s" % (seen[entry], z, list(entry), name))
+
+        seen[entry] = z
+
+_check_table("PTP", PTP, PTP_ARR)
+_check_table("QtNm", QtNm, QTNM_ARR)
 
 
 def QNum_distance(a,b, n_width, m_width, l_width, s_width):
@@ -368,36 +197,41 @@ def QNum_distance(a,b, n_width, m_width, l_width, s_width):
         c_width -- sigma in column direction
     """
 
-    na = QtNm[int(a)][0]
-    nb = QtNm[int(b)][0]
+    return _qnum_distance_i(int(a), int(b), n_width, m_width, l_width, s_width)
 
-    ma = QtNm[int(a)][1]
-    mb = QtNm[int(b)][1]
-
-    la = QtNm[int(a)][2]
-    lb = QtNm[int(b)][2]
+def _qnum_distance_i(a, b, n_width, m_width, l_width, s_width):
+    """ Same as QNum_distance(), but a and b must already be ints.
+    """
 
-    sa = QtNm[int(a)][3]
-    sb = QtNm[int(b)][3]
+    # Unpack to Python floats so the arithmetic below avoids numpy scalar overhead
+    na, ma, la, sa = QTNM_ARR[a].tolist()
+    nb, mb, lb, sb = QTNM_ARR[b].tolist()
 
-    return  np.exp(-(na - nb)**2/(4 * n_width**2)
-                   -(ma - mb)**2/(4 * m_width**2)
-                   -(la - lb)**2/(4 * l_width**2)
-                   -(sa - sb)**2/(4 * s_width**2))
+    return math.exp(-(na - nb)**2/(4 * n_width**2)
+                    -(ma - mb)**2/(4 * m_width**2)
+                    -(la - lb)**2/(4 * l_width**2)
+                    -(sa - sb)**2/(4 * s_width**2))
 
 def gen_QNum_distances(emax=100, n_width = 0.001, m_width = 0.001, l_width = 0.001, s_width = 0.001):
     """ Generate stochiometric ditance matrix
         emax -- Largest element
         r_width -- sigma in row-direction
         c_width -- sigma in column direction
+
+        The matrix is exactly symmetric, since (qa - qb)**2 == (qb - qa)**2.
     """
 
-    pd = np.zeros((emax,emax))
+    if emax > MAX_Z:
+        raise ValueError("emax = %d is larger than the largest tabulated element (%d)" % (emax, MAX_Z))
+
+    widths = np.array([n_width, m_width, l_width, s_width], dtype=np.float64)
 
-    for i in range(emax):
-        for j in range(emax):
+    q = QTNM_ARR[1:emax+1]
+    diffs = q[:,None,:] - q[None,:,:]
 
-            pd[i,j] = QNum_distance(i+1, j+1, n_width, m_width, l_width, s_width)
+    pd = (diffs**2 / (4 * widths**2)).sum(axis=-1)
+    np.negative(pd, out=pd)
+    np.exp(pd, out=pd)
 
     return pd
 
@@ -410,30 +244,48 @@ def periodic_distance(a, b, r_width, c_width):
         c_width -- sigma in column direction
     """
 
-    ra = PTP[int(a)][0]
-    rb = PTP[int(b)][0]
-    ca = PTP[int(a)][1]
-    cb = PTP[int(b)][1]
+    return _periodic_distance_i(int(a), int(b), r_width, c_width)
+
+def _periodic_distance_i(a, b, r_width, c_width):
+    """ Same as periodic_distance(), but a and b must already be ints.
+    """
+
+    ra, ca = PTP_ARR[a].tolist()
+    rb, cb = PTP_ARR[b].tolist()
 
     # return (r_width**2 * c_width**2) / ((r_width**2 + (ra - rb)**2) * (c_width**2 + (ca - cb)**2))
 
-    return np.exp(-(ra - rb)**2/(4 * r_width**2)-(ca - cb)**2/(4 * c_width**2))
+    return math.exp(-(ra - rb)**2/(4 * r_width**2)-(ca - cb)**2/(4 * c_width**2))
 
 
-def gen_pd(emax=100, r_width=0.001, c_width=0.001):
+def gen_pd(emax=100, r_width=0.001, c_width=0.001, dtype=np.float64):
     """ Generate stochiometric ditance matrix
 
         emax -- Largest element
         r_width -- sigma in row-direction
         c_width -- sigma in column direction
+        dtype -- floating point type of the returned matrix.
+                 The FCHL kernels expect float64.
+
+        The matrix is exactly symmetric, since the squared integer
+        differences are identical for (a, b) and (b, a).
     """
 
-    pd = np.zeros((emax,emax))
+    if emax > MAX_Z:
+        raise ValueError("emax = %d is larger than the largest tabulated element (%d)" % (emax, MAX_Z))
+
+    # Widen from int8, since squared column differences do not fit in int8
+    rows = PTP_ARR[1:emax+1,0].astype(np.int16)
+    cols = PTP_ARR[1:emax+1,1].astype(np.int16)
 
-    for i in range(emax):
-        for j in range(emax):
+    dr = rows[:,None] - rows[None,:]
+    dc = cols[:,None] - cols[None,:]
 
-            pd[i,j] = periodic_distance(i+1, j+1, r_width, c_width)
+    # Build the exponent in one buffer and take the exponential in-place
+    pd = (dr*dr).astype(dtype)
+    pd /= -(4 * r_width**2)
+    pd -= (dc*dc).astype(dtype)/(4 * c_width**2)
+    np.exp(pd, out=pd)
 
     return pd
 
@@ -457,24 +309,59 @@ def gen_custom(e_vec, emax=100):
     assert check_if_unique(num_dims), 'Error! Unequal number of dimensions'
 
 
+    keys = np.fromiter(e_vec.keys(), dtype=np.int64, count=len(e_vec))
+    vals = np.asarray(list(e_vec.values()), dtype=np.float64)
+
     tmp = np.zeros((emax,num_dims[0]))
+    tmp[keys] = vals
 
-    for k,v in e_vec.items():
-        tmp[k,:] = copy(v)
     pd = np.dot(tmp,tmp.T)
 
     return pd
 
 def get_alchemy(alchemy, emax=100, r_width=0.001, c_width=0.001, elemental_vectors={}, \
                 n_width = 0.001, m_width = 0.001, l_width = 0.001, s_width = 0.001):
+    """ Returns a tuple (doalchemy, pd) with the alchemical overlap matrix pd.
 
+        Recently generated matrices are cached, since the kernel functions request
+        the same matrix on every call. The cached arrays are read-only.
+
+        If doalchemy is False, pd is an identity matrix that the kernels never
+        read, so callers should check doalchemy before using pd.
+    """
 
     if (type(alchemy) == np.ndarray):
 
         doalchemy = True
         return doalchemy, alchemy
 
-    elif (alchemy == "off"):
+    if (alchemy == "off"):
+        # The widths have no effect here, so share one matrix per emax
+        return _get_cached_alchemy(alchemy, emax)
+
+    return _get_cached_alchemy(alchemy, emax, r_width, c_width, n_width, m_width, l_width, s_width,
+               tuple(sorted((k, tuple(v)) for k, v in elemental_vectors.items())))
+
+# Each matrix is only (emax, emax), but hyperparameter scans request a new one
+# for every set of widths, so only keep the most recently used ones
+@functools.lru_cache(maxsize=32)
+def _get_cached_alchemy(alchemy, emax, r_width=0.001, c_width=0.001, n_width=0.001,
+                m_width=0.001, l_width=0.001, s_width=0.001, elemental_vectors=()):
+    """ Same as get_alchemy(), but all arguments must be hashable and
+        elemental_vectors is given as a tuple of (key, vector) pairs.
+    """
+
+    doalchemy, pd = _gen_alchemy(alchemy, emax=emax, r_width=r_width, c_width=c_width,
+            elemental_vectors=dict(elemental_vectors), n_width=n_width, m_width=m_width,
+            l_width=l_width, s_width=s_width)
+    pd.setflags(write=False)
+
+    return doalchemy, pd
+
+def _gen_alchemy(alchemy, emax=100, r_width=0.001, c_width=0.001, elemental_vectors={}, \
+                n_width = 0.001, m_width = 0.001, l_width = 0.001, s_width = 0.001):
+
+    if (alchemy == "off"):
 
         pd = np.eye(emax)
         doalchemy = False
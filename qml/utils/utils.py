@@ -47,58 +47,75 @@ def is_dict(x):
 def is_numeric(x):
     return isinstance(x, (float, int))
 
+# Converts x to a numpy array once, so the checks below can share the result.
+# Returns None if x is not a non-empty array of numbers.
+def _as_numeric_array(x):
+    if not is_array_like(x):
+        return None
+    try:
+        arr = np.asarray(x)
+        if arr.dtype.kind not in "biuf":
+            arr = arr.astype(float)
+    except (ValueError, TypeError):
+        return None
+    if arr.size == 0:
+        return None
+    return arr
+
 def is_numeric_array(x):
-    if is_array_like(x) and np.asarray(x).size > 0:
-        try:
-            np.asarray(x, dtype=float)
-            return True
-        except (ValueError, TypeError):
-            return False
-    return False
+    return _as_numeric_array(x) is not None
 
 def is_numeric_1d_array(x):
-    return is_numeric_array(x) and is_1d_array(x)
+    arr = _as_numeric_array(x)
+    return arr is not None and is_1d_array(arr)
 
 # Accepts 2d arrays of shape (n,1) and (1,n) as well
 def is_1d_array(x):
-    return is_array_like(x) and (np.asarray(x).ndim == 1 or np.asarray(x).ndim == 2 and 1 in np.asarray(x).shape)
+    if not is_array_like(x):
+        return False
+    arr = np.asarray(x)
+    return (arr.ndim == 1 or arr.ndim == 2 and 1 in arr.shape)
 
 # Doesn't accept floats e.g. 1.0
 def _is_integer(x):
     return isinstance(x, int)
     #return (is_numeric(x) and (float(x) == int(x)))
 
-# will intentionally accept 0, 1 as well
+# Accepts numpy booleans, but not 0 and 1
 def is_bool(x):
-    return (x in (True, False))
+    return isinstance(x, (bool, np.bool_))
 
 def is_non_zero_integer(x):
     return (_is_integer(x) and x != 0)
 
 def _is_positive_array(x):
-    if is_numeric_array(x) and (np.asarray(x, dtype = float) > 0).all():
-        return True
-    return False
+    arr = _as_numeric_array(x)
+    return arr is not None and bool((arr > 0).all())
 
 def _is_positive_or_zero_array(x):
-    if is_numeric_array(x) and (np.asarray(x, dtype = float) >= 0).all():
-        return True
-    return False
+    arr = _as_numeric_array(x)
+    return arr is not None and bool((arr >= 0).all())
 
 def _is_integer_array(x):
-    if is_numeric_array(x):
-        if (np.asarray(x, dtype = float) == np.asarray(x, dtype = int)).all():
-            return True
-    return False
+    arr = _as_numeric_array(x)
+    if arr is None:
+        return False
+    # Integer and bool arrays need no element-wise check
+    if np.issubdtype(arr.dtype, np.integer) or arr.dtype == bool:
+        return True
+    return bool((arr == arr.astype(np.int64)).all())
 
 def is_positive_integer_1d_array(x):
-    return is_positive_integer_array(x) and is_1d_array(x)
+    arr = _as_numeric_array(x)
+    return arr is not None and is_positive_integer_array(arr) and is_1d_array(arr)
 
 def is_positive_integer_array(x):
-    return (_is_integer_array(x) and _is_positive_array(x))
+    arr = _as_numeric_array(x)
+    return arr is not None and _is_integer_array(arr) and _is_positive_array(arr)
 
 def is_positive_integer_or_zero_array(x):
-    return (_is_integer_array(x) and _is_positive_or_zero_array(x))
+    arr = _as_numeric_array(x)
+    return arr is not None and _is_integer_array(arr) and _is_positive_or_zero_array(arr)
 
 # ------------- ** Checking inputs ** --------------------------
 
@@ -111,6 +128,10 @@ def check_global_representation(x):
     :return: numpy array of floats of shape (n_samples, n_features)
     """
 
+    # Arrays that are already in the expected form are returned unchanged
+    if isinstance(x, np.ndarray) and x.ndim == 2 and x.dtype == np.float64:
+        return x
+
     if not is_array_like(x):
         raise InputError("x should be array like.")
 
@@ -130,6 +151,10 @@ def check_local_representation(x):
     :return: numpy array of floats of shape (n_samples, n_atoms, n_features)
     """
 
+    # Arrays that are already in the expected form are returned unchanged
+    if isinstance(x, np.ndarray) and x.ndim == 3 and x.dtype == np.float64:
+        return x
+
     if not is_array_like(x):
         raise InputError("x should be array like.")
 
@@ -154,6 +179,31 @@ def check_y(y):
 
     return y
 
+# Shape checks done by check_sizes(), keyed by which of (y, dy, classes) are given.
+# Each check is (dimension, arrays that must agree, only check if x is 3D, error message).
+_SIZE_CHECKS = {
+    (True, False, False): [
+        (0, ("x", "y"), False, "The descriptor and the properties should have the same first number of elements in the "
+                               "first dimension. Got %s and %s"),
+        ],
+    (False, False, True): [
+        (0, ("x", "classes"), False, "Different number of samples in the descriptor and the classes: %s and %s."),
+        (1, ("x", "classes"), True, "The number of atoms in the descriptor and in the classes is different: %s and %s."),
+        ],
+    (True, False, True): [
+        (0, ("x", "y", "classes"), False, "All x, y and classes should have the first number of elements in the first "
+                                          "dimension. Got %s, %s and %s"),
+        (1, ("x", "classes"), True, "x and classes should have the same number of elements in the 2nd dimension. Got %s "
+                                    "and %s"),
+        ],
+    (True, True, True): [
+        (0, ("x", "y", "dy", "classes"), False, "All x, y, dy and classes should have the first number of elements in "
+                                                "the first dimension. Got %s, %s, %s and %s"),
+        (1, ("x", "dy", "classes"), False, "x, dy and classes should have the same number of elements in the 2nd "
+                                           "dimension. Got %s, %s and %s"),
+        ],
+    }
+
 def check_sizes(x, y=None, dy=None, classes=None):
     """
     This function checks that the different arrays have the correct number of dimensions.
@@ -165,42 +215,21 @@ def check_sizes(x, y=None, dy=None, classes=None):
     :return: None
     """
 
-    if dy is None and classes is None:
-
-        if x.shape[0] != y.shape[0]:
-            raise InputError("The descriptor and the properties should have the same first number of elements in the "
-                             "first dimension. Got %s and %s" % (x.shape[0], y.shape[0]))
+    arrays = {"x": x, "y": y, "dy": dy, "classes": classes}
+    given = (y is not None, dy is not None, classes is not None)
 
-    elif y is None and dy is None:
-        if classes is None:
-            raise InputError("Only x is not none.")
-        else:
-            if x.shape[0] != classes.shape[0]:
-                raise InputError("Different number of samples in the descriptor and the classes: %s and %s." % (x.shape[0], classes.shape[0]))
-            if len(x.shape) == 3:
-                if x.shape[1] != classes.shape[1]:
-                    raise InputError("The number of atoms in the descriptor and in the classes is different: %s and %s." % (x.shape[1], classes.shape[1]))
+    if given == (False, False, False):
+        raise InputError("Only x is not none.")
 
-    elif dy is None and classes is not None:
+    if given not in _SIZE_CHECKS:
+        raise InputError("Unsupported combination of y, dy and classes. Given (y, dy, classes): %s" % (given,))
 
-        if x.shape[0] != y.shape[0] or x.shape[0] != classes.shape[0]:
-            raise InputError("All x, y and classes should have the first number of elements in the first dimension. Got "
-                             "%s, %s and %s" % (x.shape[0], y.shape[0], classes.shape[0]))
-
-        if len(x.shape) == 3:
-            if x.shape[1] != classes.shape[1]:
-                raise InputError("x and classes should have the same number of elements in the 2nd dimension. Got %s "
-                                 "and %s" % (x.shape[1], classes.shape[1]))
-
-    else:
-
-        if x.shape[0] != y.shape[0] or x.shape[0] != dy.shape[0] or x.shape[0] != classes.shape[0]:
-            raise InputError("All x, y, dy and classes should have the first number of elements in the first dimension. Got "
-                             "%s, %s, %s and %s" % (x.shape[0], y.shape[0], dy.shape[0], classes.shape[0]))
-
-        if x.shape[1] != dy.shape[1] or x.shape[1] != classes.shape[1]:
-            raise InputError("x, dy and classes should have the same number of elements in the 2nd dimension. Got %s, %s "
-                             "and %s" % (x.shape[1], dy.shape[1], classes.shape[1]))
+    for dim, names, only_3d, msg in _SIZE_CHECKS[given]:
+        if only_3d and len(x.shape) != 3:
+            continue
+        sizes = tuple(arrays[name].shape[dim] for name in names)
+        if sizes.count(sizes[0]) != len(sizes):
+            raise InputError(msg % sizes)
 
 def check_dy(dy):
     """
@@ -241,11 +270,11 @@ def check_classes(classes):
         if not is_array_like(classes):
             raise InputError("classes should be array like.")
 
+        classes = np.asarray(classes)
+
         if not is_positive_integer_or_zero_array(classes):
             raise InputError("classes should be an array of ints.")
 
-        classes = np.asarray(classes)
-
         if len(classes.shape) != 2:
             raise InputError("classes should be an array with 2 dimensions. Got %s" % (len(classes.shape)))
         approved_classes = classes
@@ -258,6 +287,15 @@ def get_unique(x):
     """
     Gets all unique elements in lists of lists
     """
+    # Empty sublists are skipped, as they would be concatenated as float64
+    # and promote integer input to float
+    arrays = [np.asarray(l) for l in x if len(l) > 0]
+    if len(arrays) > 0:
+        arr = np.concatenate(arrays)
+        if arr.dtype.kind in "biuf":
+            return np.unique(arr).tolist()
+
+    # Fall back to python sets for empty or non-numeric input
     elements = list(set(item for l in x for item in l))
     return sorted(elements)
 
@@ -266,11 +304,9 @@ def get_pairs(x):
     Get all unique pairs. E.g. x = [1,2,3] will return
     [[1, 1], [1, 2], [1, 3], [2, 2], [2, 3], [3, 3]]
     """
-    pairs = []
-    for i,v in enumerate(x):
-        for w in x[i:]:
-            pairs.append([v,w])
-    return pairs
+    # Index into x itself, since converting it to an array would
+    # change the type of the elements in mixed sequences
+    return [[x[i], x[j]] for i, j in zip(*np.triu_indices(len(x)))]
 
 
 # Custom exception to raise when we intentinoally catch an error
@@ -0,0 +1,47 @@
+# MIT License
+#
+# Copyright (c) 2018 Anders Steen Christensen
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Session-scoped fixtures with the QM7 test sets. The loaders live in qm7_data.py.
+"""
+
+from __future__ import print_function
+
+import pytest
+
+from qm7_data import get_qm7_data
+from qm7_data import get_qm7_bob
+
+@pytest.fixture(scope="session")
+def qm7_mols_fchl():
+    """ FCHL representations of the first 100 QM7 molecules, built once per test session.
+        Tests only read from these arrays.
+    """
+
+    return get_qm7_data(100)
+
+@pytest.fixture(scope="session")
+def qm7_mols_bob():
+    """ Bag-of-Bonds representations of 100 random QM7 molecules, built once per test session.
+    """
+
+    return get_qm7_bob(100)
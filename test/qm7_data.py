@@ -0,0 +1,194 @@
+# MIT License
+#
+# Copyright (c) 2018 Anders Steen Christensen
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+
+""" Loaders for the QM7 test sets, shared by the tests through the fixtures in
+    conftest.py. The tests' __main__ blocks call them directly.
+"""
+
+from __future__ import print_function
+
+import os
+import struct
+import collections
+import hashlib
+import tempfile
+import functools
+import inspect
+import multiprocessing
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from qml import Compound
+from qml.fchl import generate_representation
+
+def get_energies(filename):
+    """ Returns a dictionary with heats of formation for each xyz-file.
+    """
+
+    data = np.loadtxt(filename, dtype=[("name", "U64"), ("hof", "f8")], usecols=(0, 1))
+
+    return dict(zip(data["name"].tolist(), data["hof"].tolist()))
+
+QM7Data = collections.namedtuple("QM7Data", ["representations", "properties", "natoms"])
+
+# Cut-off for the QM7 FCHL representations. The representation arrays have a fixed
+# (max_size, 5, max_size) shape, so a smaller cut-off does not make them smaller.
+CUT_DISTANCE = float(os.environ.get("QML_TEST_CUT_DISTANCE", "1e6"))
+
+# Representations are cached here between test runs. The cache is only ever
+# replaced atomically, so it can be shared by parallel pytest-xdist workers.
+CACHE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), ".fchl_cache")
+
+def _cache_file(xyz_paths, cut_distance, max_size, neighbors):
+    """ Returns the cache filename for a set of xyz-files, keyed on their names,
+        sizes and modification times, the representation parameters and the
+        source of the code that reads the files and generates the representation.
+    """
+
+    key = hashlib.blake2b(struct.pack("<dII", cut_distance, max_size, neighbors))
+
+    # Changes to the representation code or to the xyz reader in Compound
+    # must not be tested against stale data
+    for source in (generate_representation, Compound):
+        with open(inspect.getsourcefile(source), "rb") as f:
+            key.update(f.read())
+
+    for xyz_path in xyz_paths:
+        stat = os.stat(xyz_path)
+        key.update(os.path.basename(xyz_path).encode())
+        key.update(struct.pack("<qq", stat.st_size, stat.st_mtime_ns))
+
+    return os.path.join(CACHE_DIR, key.hexdigest() + ".npz")
+
+# A representation takes well under a millisecond to generate, while a spawned
+# worker takes a good fraction of a second to start, so smaller sets are
+# always generated serially
+MIN_PARALLEL_MOLECULES = 1000
+
+def _build_mol(xyz_path, cut_distance=CUT_DISTANCE, max_size=23, neighbors=23):
+    """ Returns the number of atoms and FCHL representation for an xyz-file.
+        Only plain arrays are returned, so this can run in a worker process.
+    """
+
+    mol = Compound(xyz=xyz_path)
+    representation = generate_representation(mol.coordinates, mol.nuclear_charges,
+                                max_size=max_size, neighbors=neighbors, cut_distance=cut_distance)
+
+    return len(mol.nuclear_charges), representation
+
+@functools.lru_cache(maxsize=None)
+def _load_mols(xyz_paths, cut_distance=CUT_DISTANCE, max_size=23, neighbors=23):
+    """ Returns the number of atoms and FCHL representations for a tuple of xyz-files.
+        The whole set is cached on disk in a single file in CACHE_DIR.
+    """
+
+    cache_file = _cache_file(xyz_paths, cut_distance, max_size, neighbors)
+
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as cached:
+            return cached["natoms"], cached["representations"]
+
+    args = (xyz_paths, repeat(cut_distance), repeat(max_size), repeat(neighbors))
+
+    # Representations are independent, so large sets are generated in parallel.
+    # Workers are spawned rather than forked, as forking a process that has
+    # already started OpenMP threads is not safe.
+    if len(xyz_paths) < MIN_PARALLEL_MOLECULES:
+        results = list(map(_build_mol, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=os.cpu_count(),
+                    mp_context=multiprocessing.get_context("spawn")) as ex:
+            results = list(ex.map(_build_mol, *args, chunksize=64))
+
+    natoms = np.array([natoms_k for natoms_k, _ in results])
+    representations = np.empty((len(xyz_paths),) + results[0][1].shape)
+
+    for k, (_, representation) in enumerate(results):
+        representations[k] = representation
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # Write to a temporary file and rename it, so concurrent test processes
+    # (e.g. pytest -n auto) never read a partially written cache file
+    fd, tmp_file = tempfile.mkstemp(dir=CACHE_DIR, suffix=".npz")
+
+    with os.fdopen(fd, "wb") as f:
+        np.savez(f, natoms=natoms, representations=representations)
+
+    os.replace(tmp_file, cache_file)
+
+    return natoms, representations
+
+@functools.lru_cache(maxsize=None)
+def get_qm7_data(n=100, cut_distance=CUT_DISTANCE):
+    """ Returns FCHL representations, heats of formation and number of atoms
+        for the first n QM7 molecules, each stored as one array.
+        The result is built once per process and must not be modified.
+    """
+
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+
+    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
+    data = get_energies(test_dir + "/data/hof_qm7.txt")
+
+    xyz_files = sorted(data.keys())[:n]
+    xyz_paths = tuple(test_dir + "/qm7/" + xyz_file for xyz_file in xyz_files)
+
+    natoms, representations = _load_mols(xyz_paths, cut_distance)
+    properties = np.array([data[xyz_file] for xyz_file in xyz_files])
+
+    return QM7Data(representations, properties, natoms)
+
+def get_qm7_bob(n=100):
+    """ Returns Bag-of-Bonds representations for n randomly chosen QM7 molecules.
+    """
+
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+
+    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
+    data = get_energies(test_dir + "/data/hof_qm7.txt")
+
+    keys = sorted(data.keys())
+
+    # Same order as np.random.seed(666) followed by np.random.shuffle(),
+    # but without changing the global random state for other tests
+    np.random.RandomState(666).shuffle(keys)
+
+    xyz_files = keys[:n]
+
+    X = None
+
+    for k, xyz_file in enumerate(xyz_files):
+
+        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
+        mol.generate_bob()
+
+        # Fill a preallocated array rather than stacking a list of representations
+        if X is None:
+            X = np.empty((len(xyz_files),) + mol.representation.shape)
+
+        X[k] = mol.representation
+
+    return X
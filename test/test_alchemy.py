@@ -0,0 +1,96 @@
+# MIT License
+#
+# Copyright (c) 2018 Anders Steen Christensen
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from qml.utils.alchemy import PTP, PTP_ARR, QtNm, QTNM_ARR
+from qml.utils.alchemy import periodic_distance, QNum_distance
+from qml.utils.alchemy import gen_pd, gen_QNum_distances, get_alchemy
+
+def test_periodic_table():
+
+    for z in range(1, 104):
+
+        row, col = PTP_ARR[z]
+
+        assert [row, col] == PTP[z], "PTP_ARR differs from PTP for Z = %d" % z
+        assert 1 <= row <= 7, "Invalid periodic table row for Z = %d" % z
+        assert 1 <= col <= 33, "Invalid periodic table column for Z = %d" % z
+
+    positions = [tuple(PTP_ARR[z]) for z in range(1, 104)]
+    assert len(set(positions)) == len(positions), "Two elements share a position in the periodic table"
+
+    for z in range(1, 104):
+        assert np.allclose(QTNM_ARR[z], QtNm[z]), "QTNM_ARR differs from QtNm for Z = %d" % z
+
+def test_alchemy_matrices():
+
+    pd = gen_pd(emax=100, r_width=1.6, c_width=1.6)
+    qd = gen_QNum_distances(emax=100, n_width=1.0, m_width=2.0, l_width=3.0, s_width=4.0)
+
+    # The kernels rely on pd[a,b] == pd[b,a], so check exact symmetry
+    assert np.array_equal(pd, pd.T), "Periodic table distances are not symmetric"
+    assert np.array_equal(qd, qd.T), "Quantum number distances are not symmetric"
+    assert np.allclose(np.diag(pd), 1.0), "Error in periodic table distance diagonal"
+    assert np.allclose(np.diag(qd), 1.0), "Error in quantum number distance diagonal"
+
+    for a, b in [(1, 6), (6, 7), (8, 16), (31, 49), (26, 44), (57, 89)]:
+        assert np.allclose(pd[a-1, b-1], periodic_distance(a, b, 1.6, 1.6)), "Error in periodic table distances"
+        assert np.allclose(qd[a-1, b-1], QNum_distance(a, b, 1.0, 2.0, 3.0, 4.0)), "Error in quantum number distances"
+
+    # Elements beyond the periodic table must not be silently dropped
+    with pytest.raises(ValueError):
+        gen_pd(emax=PTP_ARR.shape[0])
+
+    with pytest.raises(ValueError):
+        gen_QNum_distances(emax=QTNM_ARR.shape[0])
+
+def test_get_alchemy():
+
+    doalchemy, pd = get_alchemy("periodic-table", emax=100, r_width=1.6, c_width=1.6)
+    doalchemy2, pd2 = get_alchemy("periodic-table", emax=100, r_width=1.6, c_width=1.6)
+
+    assert doalchemy and doalchemy2, "Error in alchemy flag"
+    assert pd is pd2, "Alchemy matrix was not cached"
+    assert not pd.flags.writeable, "Cached alchemy matrix is writeable"
+    assert np.allclose(pd, gen_pd(emax=100, r_width=1.6, c_width=1.6)), "Error in cached alchemy matrix"
+
+    doalchemy, pd = get_alchemy("off", emax=100)
+
+    assert not doalchemy, "Error in alchemy flag"
+    assert np.allclose(pd, np.eye(100)), "Error in alchemy off"
+
+    elemental_vectors = {1: [1.0, 0.0], 6: [0.5, 0.5]}
+    doalchemy, pd = get_alchemy("custom", emax=10, elemental_vectors=elemental_vectors)
+
+    assert pd.shape == (10, 10), "Error in custom alchemy shape"
+    assert np.allclose(pd[1, 6], 0.5), "Error in custom alchemy"
+    assert np.allclose(pd[6, 6], 0.5), "Error in custom alchemy"
+
+if __name__ == "__main__":
+
+    test_periodic_table()
+    test_alchemy_matrices()
+    test_get_alchemy()
@@ -25,16 +25,16 @@ from __future__ import print_function
 
 import os
 import numpy as np
+import pytest
 
 import scipy
-from scipy.special import jn
+from scipy.special import jv
 from scipy.special import binom
 from scipy.special import factorial
+from scipy.linalg import cho_factor, cho_solve
+from scipy.linalg.blas import dgemv
 
 from qml import Compound
-
-from qml.math import cho_solve
-
 from qml.fchl import generate_representation
 from qml.fchl import get_local_symmetric_kernels
 from qml.fchl import get_local_kernels
@@ -43,31 +43,61 @@ from qml.fchl import get_global_kernels
 from qml.fchl import get_atomic_kernels
 from qml.fchl import get_atomic_symmetric_kernels
 
-def get_energies(filename):
-    """ Returns a dictionary with heats of formation for each xyz-file.
+from qm7_data import CUT_DISTANCE
+from qm7_data import get_energies
+from qm7_data import get_qm7_data
+
+def get_l2_distances(Sii_diag, Sjj_diag, Sij):
+    """ Returns the squared distances between all atoms in two molecules,
+        given the diagonals of the atomic linear kernels Sii and Sjj and the kernel Sij.
     """
 
-    f = open(filename, "r")
-    lines = f.readlines()
-    f.close()
+    return Sii_diag[:,np.newaxis] + Sjj_diag[np.newaxis,:] - 2 * Sij
+
+def get_atomic_kernel_blocks(X, natoms, kernel_args):
+    """ Returns the atomic kernels between all pairs of molecules in X as nested lists,
+        so that S[i][j] is the (natoms[i], natoms[j]) kernel between molecules i and j.
+        Only the upper triangle is computed, as S[j][i] is the transpose of S[i][j].
+    """
 
-    energies = dict()
+    # f2py copies C-ordered arrays to Fortran order on every call,
+    # so convert the atomic representations of each molecule once
+    X_atoms = [np.asfortranarray(Xi[:n]) for Xi, n in zip(X, natoms)]
+
+    rows = [[get_atomic_kernels(X_atoms[i], X_atoms[j], **kernel_args)[0]
+                for j in range(i, len(X))] for i in range(len(X))]
+
+    return [[rows[i][j-i] if j >= i else rows[j][i-j].T for j in range(len(X))]
+                for i in range(len(X))]
+
+def get_linear_kernel_blocks(qm7_mols_fchl, n=5):
+    """ Returns the atomic linear kernels between the first n molecules.
+    """
 
-    for line in lines:
-        tokens = line.split()
+    linear_kernel_args = {
+        "kernel": "linear",
+        "kernel_args": {
+            "c": [0.0],
+        },
+    }
 
-        xyz_name = tokens[0]
-        hof = float(tokens[1])
+    return get_atomic_kernel_blocks(qm7_mols_fchl.representations[:n],
+                qm7_mols_fchl.natoms[:n], linear_kernel_args)
 
-        energies[xyz_name] = hof
+@pytest.fixture(scope="module")
+def qm7_linear_kernel_blocks(qm7_mols_fchl):
+    """ Atomic linear kernels between the first five QM7 molecules, as returned by
+        get_atomic_kernel_blocks(). The kernel reference tests only post-process
+        these blocks, so they are computed once and shared. Tests must not modify them.
+    """
 
-    return energies
+    return get_linear_kernel_blocks(qm7_mols_fchl)
 
 def test_krr_fchl_local():
 
     # Test that all kernel arguments work
     kernel_args = {
-            "cut_distance": 1e6,
+            "cut_distance": CUT_DISTANCE,
             "cut_start": 0.5,
             "two_body_width": 0.1,
             "two_body_scaling": 2.0,
@@ -90,10 +120,11 @@ def test_krr_fchl_local():
     # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
     data = get_energies(test_dir + "/data/hof_qm7.txt")
 
-    # Generate a list of Compound() objects"
+    # Generate a list of Compound() objects. Unlike the other tests, this one
+    # does not use the shared QM7 set, so Compound.generate_fchl_representation()
+    # stays covered.
     mols = []
 
-
     for xyz_file in sorted(data.keys())[:100]:
 
         # Initialize the Compound() objects
@@ -102,27 +133,26 @@ def test_krr_fchl_local():
         # Associate a property (heat of formation) with the object
         mol.properties = data[xyz_file]
 
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.generate_fchl_representation(cut_distance=1e6)
+        mol.generate_fchl_representation(cut_distance=CUT_DISTANCE)
         mols.append(mol)
 
     # Shuffle molecules
     np.random.seed(666)
-    np.random.shuffle(mols)
+    order = np.arange(len(mols))
+    np.random.shuffle(order)
 
     # Make training and test sets
-    n_test  = len(mols) // 3
-    n_train = len(mols) - n_test
+    n_test  = len(order) // 3
+    n_train = len(order) - n_test
 
-    training = mols[:n_train]
-    test  = mols[-n_test:]
+    # Gather the shuffled set once; the training and test sets are views into it
+    X_all = np.array([mols[k].representation for k in order])
+    Y_all = np.array([mols[k].properties for k in order])
 
-    X = np.array([mol.representation for mol in training])
-    Xs = np.array([mol.representation for mol in test])
+    X, Xs = X_all[:n_train], X_all[-n_test:]
 
     # List of properties
-    Y = np.array([mol.properties for mol in training])
-    Ys = np.array([mol.properties for mol in test])
+    Y, Ys = Y_all[:n_train], Y_all[-n_test:]
 
     # Set hyper-parameters
     llambda = 1e-8
@@ -131,24 +161,25 @@ def test_krr_fchl_local():
     K = get_local_kernels(X, X, **kernel_args)[0]
 
     assert np.allclose(K, K_symmetric), "Error in FCHL symmetric local kernels"
-    assert np.invert(np.all(np.isnan(K_symmetric))), "FCHL local symmetric kernel contains NaN"
-    assert np.invert(np.all(np.isnan(K))), "FCHL local kernel contains NaN"
+    assert not np.isnan(K_symmetric).any(), "FCHL local symmetric kernel contains NaN"
+    assert not np.isnan(K).any(), "FCHL local kernel contains NaN"
 
-    # Solve alpha
-    K[np.diag_indices_from(K)] += llambda
-    alpha = cho_solve(K,Y)
+    # Solve alpha. The Fortran kernels return K in Fortran order,
+    # so LAPACK can factorize it in place without a copy.
+    K.flat[::K.shape[0]+1] += llambda
+    alpha = cho_solve(cho_factor(K, lower=True, overwrite_a=True, check_finite=False), Y, check_finite=False)
 
     # Calculate prediction kernel
     Ks = get_local_kernels(Xs, X, **kernel_args)[0]
-    assert np.invert(np.all(np.isnan(Ks))), "FCHL local testkernel contains NaN"
+    assert not np.isnan(Ks).any(), "FCHL local testkernel contains NaN"
 
-    Yss = np.dot(Ks, alpha)
+    Yss = dgemv(1.0, Ks, alpha)
 
     mae = np.mean(np.abs(Ys - Yss))
     assert abs(2 - mae) < 1.0, "Error in FCHL local kernel-ridge regression"
 
 
-def test_krr_fchl_global():
+def test_krr_fchl_global(qm7_mols_fchl):
 
     # Test that all kernel arguments work
     kernel_args = {
@@ -157,45 +188,23 @@ def test_krr_fchl_global():
                 "sigma": [100.0],
                 },
             }
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of Compound() objects"
-    mols = []
-
-
-    for xyz_file in sorted(data.keys())[:100]:
-
-        # Initialize the Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
-
-        # Associate a property (heat of formation) with the object
-        mol.properties = data[xyz_file]
-
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
-
     # Shuffle molecules
     np.random.seed(666)
-    np.random.shuffle(mols)
+    order = np.arange(100)
+    np.random.shuffle(order)
 
     # Make training and test sets
-    n_test  = len(mols) // 3
-    n_train = len(mols) - n_test
+    n_test  = len(order) // 3
+    n_train = len(order) - n_test
 
-    training = mols[:n_train]
-    test  = mols[-n_test:]
+    # Gather the shuffled set once; the training and test sets are views into it
+    X_all = qm7_mols_fchl.representations[order]
+    Y_all = qm7_mols_fchl.properties[order]
 
-    X = np.array([mol.representation for mol in training])
-    Xs = np.array([mol.representation for mol in test])
+    X, Xs = X_all[:n_train], X_all[-n_test:]
 
     # List of properties
-    Y = np.array([mol.properties for mol in training])
-    Ys = np.array([mol.properties for mol in test])
+    Y, Ys = Y_all[:n_train], Y_all[-n_test:]
 
     # Set hyper-parameters
     # sigma = 100.0
@@ -205,17 +214,18 @@ def test_krr_fchl_global():
     K = get_global_kernels(X, X, **kernel_args)[0]
 
     assert np.allclose(K, K_symmetric), "Error in FCHL symmetric global kernels"
-    assert np.invert(np.all(np.isnan(K_symmetric))), "FCHL global symmetric kernel contains NaN"
-    assert np.invert(np.all(np.isnan(K))), "FCHL global kernel contains NaN"
+    assert not np.isnan(K_symmetric).any(), "FCHL global symmetric kernel contains NaN"
+    assert not np.isnan(K).any(), "FCHL global kernel contains NaN"
 
-    # Solve alpha
-    K[np.diag_indices_from(K)] += llambda
-    alpha = cho_solve(K,Y)
+    # Solve alpha. The Fortran kernels return K in Fortran order,
+    # so LAPACK can factorize it in place without a copy.
+    K.flat[::K.shape[0]+1] += llambda
+    alpha = cho_solve(cho_factor(K, lower=True, overwrite_a=True, check_finite=False), Y, check_finite=False)
 
     Ks = get_global_kernels(Xs, X, **kernel_args)[0]
-    assert np.invert(np.all(np.isnan(Ks))), "FCHL global testkernel contains NaN"
+    assert not np.isnan(Ks).any(), "FCHL global testkernel contains NaN"
 
-    Yss = np.dot(Ks, alpha)
+    Yss = dgemv(1.0, Ks, alpha)
 
     print(Ys, Yss)
 
@@ -223,7 +233,7 @@ def test_krr_fchl_global():
     assert abs(2 - mae) < 1.0, "Error in FCHL global kernel-ridge regression"
 
 
-def test_krr_fchl_atomic():
+def test_krr_fchl_atomic(qm7_mols_fchl):
 
     kernel_args = {
             "kernel": "gaussian",
@@ -232,48 +242,33 @@ def test_krr_fchl_atomic():
                 },
             }
 
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of Compound() objects"
-    mols = []
-
-    for xyz_file in sorted(data.keys())[:10]:
-
-        # Initialize the Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
-
-        # Associate a property (heat of formation) with the object
-        mol.properties = data[xyz_file]
-
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
-
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:10]
+    natoms = qm7_mols_fchl.natoms[:10]
 
     K = get_local_symmetric_kernels(X, **kernel_args)[0]
+    K_full = get_local_kernels(X, X, **kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
-
-    for i, Xi in enumerate(X):
-        for j, Xj in enumerate(X):
+    assert np.allclose(K, K_full), "Error in FCHL local kernels"
 
+    X_atoms = np.concatenate([Xi[:n] for Xi, n in zip(X, natoms)])
+    offsets = np.concatenate([[0], np.cumsum(natoms)])[:-1]
 
-            K_atomic = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **kernel_args)[0]
-            K_test[i,j] = np.sum(K_atomic)
+    # Atomic kernel between all atoms in all molecules in one call, summed over
+    # all (i, j) blocks of atoms at once. Only the block sums are kept.
+    K_test = np.add.reduceat(np.add.reduceat(get_atomic_kernels(X_atoms, X_atoms, **kernel_args)[0],
+                offsets, axis=0), offsets, axis=1)
 
-            assert np.invert(np.all(np.isnan(K_atomic))), "FCHL atomic kernel contains NaN"
+    # A NaN anywhere in the atomic kernel propagates to its block sum
+    assert not np.isnan(K_test).any(), "FCHL atomic kernel contains NaN"
 
-            if (i == j):
-                K_atomic_symmetric = get_atomic_symmetric_kernels(Xi[:mols[i].natoms], **kernel_args)[0]
-                assert np.allclose(K_atomic, K_atomic_symmetric), "Error in FCHL symmetric atomic kernels"
-                assert np.invert(np.all(np.isnan(K_atomic_symmetric))), "FCHL atomic symmetric kernel contains NaN"
+    # The full atomic matrices are only needed on the diagonal
+    for i, Xi in enumerate(X):
+        K_atomic = get_atomic_kernels(Xi[:natoms[i]], Xi[:natoms[i]], **kernel_args)[0]
+        K_atomic_symmetric = get_atomic_symmetric_kernels(Xi[:natoms[i]], **kernel_args)[0]
+        assert np.allclose(K_atomic, K_atomic_symmetric), "Error in FCHL symmetric atomic kernels"
+        assert not np.isnan(K_atomic_symmetric).any(), "FCHL atomic symmetric kernel contains NaN"
 
-    assert np.allclose(K, K_test), "Error in FCHL atomic kernels"
+    assert np.allclose(K_full, K_test), "Error in FCHL atomic kernels"
 
 def test_fchl_local_periodic():
     kernel_args = {
@@ -285,132 +280,15 @@ def test_fchl_local_periodic():
                 },
             }
 
-    nuclear_charges = [
-    np.array([13, 13, 58, 58, 58, 58, 58, 58, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 23, 23]),
-    np.array([34, 34, 34, 34, 34, 34, 34, 34, 34, 34, 34, 34, 73, 73, 73, 73, 81, 81, 81, 81]),
-    np.array([48, 8, 8, 8, 8, 8, 8, 51, 51]),
-    np.array([16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30, 30]),
-    np.array([58, 58, 8, 8, 8, 8, 8, 8, 8, 8, 23, 23])]
-
-    cells = np.array([
-[[  1.01113290e+01,  -1.85000000e-04,   0.00000000e+00],
- [ -5.05582400e+00,   8.75745400e+00,   0.00000000e+00],
- [  0.00000000e+00,   0.00000000e+00,   6.15100100e+00]],
-[[  9.672168,   0.      ,   0.      ],
- [  0.      ,   3.643786,   0.      ],
- [  0.      ,   0.      ,  14.961818]],
-[[  5.28208000e+00,  -1.20000000e-05,   1.50000000e-05],
- [ -2.64105000e+00,   4.57443400e+00,  -3.00000000e-05],
- [  1.40000000e-05,  -2.40000000e-05,   4.77522000e+00]],
-[[ -1.917912,   3.321921,   0.      ],
- [  3.835824,   0.      ,   0.      ],
- [  1.917912,  -1.107307, -56.423542]],
-[[ 3.699168,  3.699168, -3.255938],
- [ 3.699168, -3.699168,  3.255938],
- [-3.699168, -3.699168, -3.255938]]])
-
-    fractional_coordinates = [
-[[ 0.6666706 ,  0.33333356,  0.15253127],
- [ 0.33332896,  0.66666655,  0.65253119],
- [ 0.14802736,  0.375795  ,  0.23063888],
- [ 0.62422269,  0.77225019,  0.23063888],
- [ 0.22775607,  0.85196133,  0.23063888],
- [ 0.77224448,  0.14803879,  0.7306388 ],
- [ 0.37577687,  0.22774993,  0.7306388 ],
- [ 0.8519722 ,  0.62420512,  0.7306388 ],
- [ 0.57731818,  0.47954083,  0.0102715 ],
- [ 0.52043884,  0.09777799,  0.01028288],
- [ 0.90211803,  0.4226259 ,  0.01032677],
- [ 0.33335216,  0.6666734 ,  0.01482035],
- [ 0.90959766,  0.77585201,  0.30637615],
- [ 0.86626106,  0.09040873,  0.3063794 ],
- [ 0.22415808,  0.13374794,  0.30638265],
- [ 0.42268138,  0.52045928,  0.51027142],
- [ 0.47956114,  0.90222098,  0.5102828 ],
- [ 0.09788153,  0.57737421,  0.51032669],
- [ 0.6666474 ,  0.33332671,  0.51482027],
- [ 0.09040133,  0.22414696,  0.80637769],
- [ 0.13373793,  0.90959025,  0.80637932],
- [ 0.77584247,  0.86625217,  0.80638257],
- [ 0.        ,  0.        ,  0.05471142],
- [ 0.        ,  0.        ,  0.55471134]],
-[[ 0.81615001,  0.75000014,  0.00116296],
- [ 0.52728096,  0.25000096,  0.0993275 ],
- [ 0.24582596,  0.75000014,  0.2198563 ],
- [ 0.74582658,  0.75000014,  0.28014376],
- [ 0.02728137,  0.25000096,  0.40067257],
- [ 0.31615042,  0.75000014,  0.49883711],
- [ 0.68384978,  0.25000096,  0.50116236],
- [ 0.97271884,  0.75000014,  0.59932757],
- [ 0.25417362,  0.25000096,  0.71985637],
- [ 0.75417321,  0.25000096,  0.78014383],
- [ 0.47271925,  0.75000014,  0.90067263],
- [ 0.1838502 ,  0.25000096,  0.99883717],
- [ 0.33804831,  0.75000014,  0.07120258],
- [ 0.83804789,  0.75000014,  0.42879749],
- [ 0.16195232,  0.25000096,  0.57120198],
- [ 0.6619519 ,  0.25000096,  0.92879756],
- [ 0.98245812,  0.25000096,  0.17113829],
- [ 0.48245853,  0.25000096,  0.32886177],
- [ 0.51754167,  0.75000014,  0.67113836],
- [ 0.01754209,  0.75000014,  0.82886184]],
-[[  0.00000000e+00,   0.00000000e+00,   0.00000000e+00],
- [  3.66334233e-01,   1.96300000e-07,   2.70922493e-01],
- [  6.33665197e-01,   6.33666177e-01,   2.70923540e-01],
- [  3.62000000e-08,   3.66333081e-01,   2.70923851e-01],
- [  6.70000000e-09,   6.33664733e-01,   7.29076149e-01],
- [  6.33664135e-01,   9.99998055e-01,   7.29076460e-01],
- [  3.66336157e-01,   3.66334260e-01,   7.29077507e-01],
- [  3.33333635e-01,   6.66667395e-01,   4.99998953e-01],
- [  6.66667720e-01,   3.33333042e-01,   5.00000000e-01]],
-[[ 0.3379644 ,  0.66203644,  0.01389048],
- [ 0.02316309,  0.97683587,  0.06948926],
- [ 0.70833843,  0.29165976,  0.12501892],
- [ 0.39352259,  0.60647824,  0.18056506],
- [ 0.74538243,  0.25461577,  0.2361509 ],
- [ 0.09722803,  0.90277092,  0.2916841 ],
- [ 0.44907919,  0.55092165,  0.34723485],
- [ 0.8009281 ,  0.1990701 ,  0.4027879 ],
- [ 0.15278103,  0.84721793,  0.45834308],
- [ 0.83797345,  0.16202475,  0.51392396],
- [ 0.52315813,  0.4768427 ,  0.56947169],
- [ 0.20833916,  0.7916598 ,  0.62501748],
- [ 0.89352691,  0.10647128,  0.68058436],
- [ 0.57870427,  0.42129656,  0.73611012],
- [ 0.93056329,  0.06943491,  0.79169347],
- [ 0.28241704,  0.71758191,  0.84725114],
- [ 0.63426956,  0.36573128,  0.90280596],
- [ 0.98611817,  0.01388002,  0.95835813],
- [ 0.        ,  0.        ,  0.        ],
- [ 0.35185434,  0.64814649,  0.05556032],
- [ 0.03704151,  0.96295744,  0.11112454],
- [ 0.72221887,  0.27777932,  0.16666022],
- [ 0.40741437,  0.59258647,  0.22224039],
- [ 0.75926009,  0.24073811,  0.27778387],
- [ 0.11111195,  0.888887  ,  0.33333586],
- [ 0.46296234,  0.53703849,  0.38888431],
- [ 0.81480954,  0.18518866,  0.44443222],
- [ 0.16667233,  0.83332662,  0.500017  ],
- [ 0.85185117,  0.14814703,  0.55555711],
- [ 0.53704217,  0.46295866,  0.61112381],
- [ 0.22222196,  0.777777  ,  0.66666587],
- [ 0.90740847,  0.09258972,  0.72222903],
- [ 0.59259328,  0.40740756,  0.77777712],
- [ 0.94444213,  0.05555607,  0.83333   ],
- [ 0.29630132,  0.70369764,  0.88890396],
- [ 0.64815247,  0.35184836,  0.94445471]],
-[[ 0.        ,  0.        ,  0.        ],
- [ 0.75000042,  0.50000027,  0.25000015],
- [ 0.15115386,  0.81961403,  0.33154037],
- [ 0.51192691,  0.18038651,  0.3315404 ],
- [ 0.08154025,  0.31961376,  0.40115401],
- [ 0.66846017,  0.81961403,  0.48807366],
- [ 0.08154025,  0.68038678,  0.76192703],
- [ 0.66846021,  0.18038651,  0.84884672],
- [ 0.23807355,  0.31961376,  0.91846033],
- [ 0.59884657,  0.68038678,  0.91846033],
- [ 0.50000031,  0.        ,  0.50000031],
- [ 0.25000015,  0.50000027,  0.75000042]]]
+    test_dir = os.path.dirname(os.path.realpath(__file__))
+
+    # Five periodic crystal structures, with atoms of all structures concatenated
+    data = np.load(test_dir + "/data/fchl_periodic_inputs.npz")
+
+    split = np.cumsum(data["natoms"])[:-1]
+    nuclear_charges = np.split(data["nuclear_charges"], split)
+    fractional_coordinates = np.split(data["fractional_coordinates"], split)
+    cells = data["cells"]
 
     n = 5
 
@@ -420,67 +298,22 @@ def test_fchl_local_periodic():
 
     K = get_local_symmetric_kernels(X, **kernel_args)
 
-    K_ref = np.array(
-    [[  530.03184304,   435.65196293,   198.61245535,   782.49428327,   263.53562172],
-     [  435.65196293,   371.35281119,   163.83766549,   643.99777576,   215.04338938],
-     [  198.61245535,   163.83766549,    76.12134823,   295.02739281,    99.89595704],
-     [  782.49428327,   643.99777576,   295.02739281,  1199.61736141,   389.31169487],
-     [  263.53562172,   215.04338938,    99.89595704,   389.31169487,   133.36920188]]
-    )
+    K_ref = np.load(test_dir + "/data/fchl_periodic_K_ref.npy")
 
     assert np.allclose(K, K_ref), "Error in periodic FCHL"
 
-def test_krr_fchl_alchemy():
+def test_krr_fchl_alchemy(qm7_mols_fchl):
 
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of Compound() objects"
-    mols = []
-
-
-    for xyz_file in sorted(data.keys())[:20]:
-
-        # Initialize the Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
+    # Shuffle molecules
+    np.random.seed(666)
+    order = np.arange(20)
+    np.random.shuffle(order)
 
-        # Associate a property (heat of formation) with the object
-        mol.properties = data[xyz_file]
+    X = qm7_mols_fchl.representations[order]
 
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.generate_fchl_representation(cut_distance=1e6)
-        mols.append(mol)
+    test_dir = os.path.dirname(os.path.realpath(__file__))
 
-    # Shuffle molecules
-    np.random.seed(666)
-    np.random.shuffle(mols)
-
-
-    X = np.array([mol.representation for mol in mols])
-
-    np.set_printoptions(edgeitems = 16, linewidth=6666)
-    overlap = np.array([[ 1.        ,  0.00835282,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.02696323,  0.00757568,  0.67663385,  0.61368025,  0.45783336,  0.28096329,  0.14183016,  0.05889311,  0.02011579,  0.0056518 ,  0.41523683,  0.37660345],
-       [ 0.00835282,  1.        ,  0.00757568,  0.02696323,  0.07894037,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.0056518 ,  0.02011579,  0.05889311,  0.14183016,  0.28096329,  0.45783336,  0.61368025,  0.67663385,  0.0034684 ,  0.01234467],
-       [ 0.90696062,  0.00757568,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.20961139,  0.08703837,  0.02972922,  0.00835282,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.02696323,  0.00757568,  0.67663385,  0.61368025],
-       [ 0.82257756,  0.02696323,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.20961139,  0.08703837,  0.02972922,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.02696323,  0.61368025,  0.67663385],
-       [ 0.61368025,  0.07894037,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.20961139,  0.08703837,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.45783336,  0.61368025],
-       [ 0.37660345,  0.19010927,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.20961139,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.28096329,  0.45783336],
-       [ 0.19010927,  0.37660345,  0.20961139,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.14183016,  0.28096329],
-       [ 0.07894037,  0.61368025,  0.08703837,  0.20961139,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.07894037,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.05889311,  0.14183016],
-       [ 0.02696323,  0.82257756,  0.02972922,  0.08703837,  0.20961139,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.02696323,  0.07894037,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.02011579,  0.05889311],
-       [ 0.00757568,  0.90696062,  0.00835282,  0.02972922,  0.08703837,  0.20961139,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.00757568,  0.02696323,  0.07894037,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.0056518 ,  0.02011579],
-       [ 0.67663385,  0.0056518 ,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.02696323,  0.00757568,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.20961139,  0.08703837,  0.02972922,  0.00835282,  0.90696062,  0.82257756],
-       [ 0.61368025,  0.02011579,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.02696323,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.20961139,  0.08703837,  0.02972922,  0.82257756,  0.90696062],
-       [ 0.45783336,  0.05889311,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.20961139,  0.08703837,  0.61368025,  0.82257756],
-       [ 0.28096329,  0.14183016,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.20961139,  0.37660345,  0.61368025],
-       [ 0.14183016,  0.28096329,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.20961139,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.41523683,  0.19010927,  0.37660345],
-       [ 0.05889311,  0.45783336,  0.07894037,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.08703837,  0.20961139,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.67663385,  0.07894037,  0.19010927],
-       [ 0.02011579,  0.61368025,  0.02696323,  0.07894037,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.82257756,  0.02972922,  0.08703837,  0.20961139,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.90696062,  0.02696323,  0.07894037],
-       [ 0.0056518 ,  0.67663385,  0.00757568,  0.02696323,  0.07894037,  0.19010927,  0.37660345,  0.61368025,  0.82257756,  0.90696062,  0.00835282,  0.02972922,  0.08703837,  0.20961139,  0.41523683,  0.67663385,  0.90696062,  1.        ,  0.00757568,  0.02696323],
-       [ 0.41523683,  0.0034684 ,  0.67663385,  0.61368025,  0.45783336,  0.28096329,  0.14183016,  0.05889311,  0.02011579,  0.0056518 ,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.02696323,  0.00757568,  1.        ,  0.90696062],
-       [ 0.37660345,  0.01234467,  0.61368025,  0.67663385,  0.61368025,  0.45783336,  0.28096329,  0.14183016,  0.05889311,  0.02011579,  0.82257756,  0.90696062,  0.82257756,  0.61368025,  0.37660345,  0.19010927,  0.07894037,  0.02696323,  0.90696062,  1.        ]])
+    overlap = np.load(test_dir + "/data/fchl_alchemy_overlap.npy")
 
     kernel_args = {
             "alchemy": "periodic-table",
@@ -526,76 +359,38 @@ def test_krr_fchl_alchemy():
 
     assert np.allclose(K_noalchemy, K_custom), "Error in no-alchemy"
 
-def test_fchl_linear():
-
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
+def test_fchl_linear(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-    for xyz_file in sorted(data.keys())[:5]:
-
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
-
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
-
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
 
     K = get_local_symmetric_kernels(X)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
+    K_test = np.zeros((len(X),len(X)))
 
-    kernel_args = {
-            "kernel": "linear",
-            "kernel_args": {"c": [1.0],},
-        }
+    S = qm7_linear_kernel_blocks
 
-    for i, Xi in enumerate(X):
-        Sii = get_atomic_kernels(Xi[:mols[i].natoms], Xi[:mols[i].natoms], **kernel_args)[0]
-        for j, Xj in enumerate(X):
+    # Diagonals of the atomic self-kernels, needed for the l2 distances
+    S_diag = [np.diag(S[i][i]) for i in range(len(X))]
 
+    # Gaussian kernel with the default sigma = 2.5
+    inv_2sigma2 = 1.0 / (2.0 * 2.5**2)
 
-            Sjj = get_atomic_kernels(Xj[:mols[j].natoms], Xj[:mols[j].natoms], **kernel_args)[0]
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **kernel_args)[0]
+            Sij = S[i][j]
 
-            for ii in range(Sii.shape[0]):
-                for jj in range(Sjj.shape[0]):
-
-                    l2 = Sii[ii,ii] + Sjj[jj,jj] - 2 * Sij[ii,jj]
-                    K_test[i,j] += np.exp(- l2 / (2*(2.5**2)))
+            l2 = get_l2_distances(S_diag[i], S_diag[j], Sij)
+            K_test[i,j] = np.sum(np.exp(-l2 * inv_2sigma2))
+            K_test[j,i] = K_test[i,j]
 
     assert np.allclose(K, K_test), "Error in FCHL linear kernels"
 
 
-def test_fchl_polynomial():
-
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
+def test_fchl_polynomial(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-    # Generate a list of qml.Compound() objects"
-    mols = []
-
-    for xyz_file in sorted(data.keys())[:5]:
-
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
-
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
-
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
     
     polynomial_kernel_args = {
         "kernel": "polynomial",
@@ -606,52 +401,32 @@ def test_fchl_polynomial():
         },
     }
 
-    linear_kernel_args = {
-        "kernel": "linear",
-        "kernel_args": {
-            "c": [0.0],
-        },
-    }
-
 
     K = get_local_symmetric_kernels(X, **polynomial_kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
-
-    for i, Xi in enumerate(X):
-        for j, Xj in enumerate(X):
+    K_test = np.zeros((len(X),len(X)))
 
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
+    alpha = polynomial_kernel_args["kernel_args"]["alpha"][0]
+    c = polynomial_kernel_args["kernel_args"]["c"][0]
+    d = polynomial_kernel_args["kernel_args"]["d"][0]
 
-            for ii in range(Sij.shape[0]):
-                for jj in range(Sij.shape[1]):
+    S = qm7_linear_kernel_blocks
 
-                    K_test[i,j] += (2.0 * Sij[ii,jj] + 3.0)**4.0
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
-    assert np.allclose(K, K_test), "Error in FCHL polynomial kernels"
+            Sij = S[i][j]
 
+            K_test[i,j] = np.sum((alpha * Sij + c)**d)
+            K_test[j,i] = K_test[i,j]
 
-def test_fchl_sigmoid():
-
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
-
-    for xyz_file in sorted(data.keys())[:5]:
+    assert np.allclose(K, K_test), "Error in FCHL polynomial kernels"
 
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
 
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
+def test_fchl_sigmoid(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
     
     sigmoid_kernel_args = {
         "kernel": "sigmoid",
@@ -661,53 +436,31 @@ def test_fchl_sigmoid():
         },
     }
 
-    linear_kernel_args = {
-        "kernel": "linear",
-        "kernel_args": {
-            "c": [0.0],
-        },
-    }
-
 
     K = get_local_symmetric_kernels(X, **sigmoid_kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
-
-    for i, Xi in enumerate(X):
-        for j, Xj in enumerate(X):
-
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
+    K_test = np.zeros((len(X),len(X)))
 
-            for ii in range(Sij.shape[0]):
-                for jj in range(Sij.shape[1]):
+    alpha = sigmoid_kernel_args["kernel_args"]["alpha"][0]
+    c = sigmoid_kernel_args["kernel_args"]["c"][0]
 
-                    # K_test[i,j] += (2.0 * Sij[ii,jj] + 3.0)**4.0
-                    K_test[i,j] += np.tanh(2.0 * Sij[ii,jj] + 3.0)
-
-    assert np.allclose(K, K_test), "Error in FCHL sigmoid kernels"
+    S = qm7_linear_kernel_blocks
 
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
-def test_fchl_multiquadratic():
+            Sij = S[i][j]
 
-    test_dir = os.path.dirname(os.path.realpath(__file__))
+            K_test[i,j] = np.sum(np.tanh(alpha * Sij + c))
+            K_test[j,i] = K_test[i,j]
 
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
+    assert np.allclose(K, K_test), "Error in FCHL sigmoid kernels"
 
-    for xyz_file in sorted(data.keys())[:5]:
 
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
+def test_fchl_multiquadratic(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
-
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
     
     kernel_args = {
         "kernel": "multiquadratic",
@@ -716,55 +469,34 @@ def test_fchl_multiquadratic():
         },
     }
 
-    linear_kernel_args = {
-        "kernel": "linear",
-        "kernel_args": {
-            "c": [0.0],
-        },
-    }
-
 
     K = get_local_symmetric_kernels(X, **kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
+    K_test = np.zeros((len(X),len(X)))
 
-    for i, Xi in enumerate(X):
-        Sii = get_atomic_kernels(Xi[:mols[i].natoms], Xi[:mols[i].natoms], **linear_kernel_args)[0]
-        for j, Xj in enumerate(X):
-
-            Sjj = get_atomic_kernels(Xj[:mols[j].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
+    c2 = kernel_args["kernel_args"]["c"][0]**2
 
-            for ii in range(Sii.shape[0]):
-                for jj in range(Sjj.shape[0]):
+    S = qm7_linear_kernel_blocks
 
-                    l2 = Sii[ii,ii] + Sjj[jj,jj] - 2 * Sij[ii,jj]
-                    K_test[i,j] += np.sqrt(l2 + 4.0)
+    # Diagonals of the atomic self-kernels, needed for the l2 distances
+    S_diag = [np.diag(S[i][i]) for i in range(len(X))]
 
-    assert np.allclose(K, K_test), "Error in FCHL multiquadratic kernels"
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
+            Sij = S[i][j]
 
-def test_fchl_inverse_multiquadratic():
+            l2 = get_l2_distances(S_diag[i], S_diag[j], Sij)
+            K_test[i,j] = np.sum(np.sqrt(l2 + c2))
+            K_test[j,i] = K_test[i,j]
 
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
-
-    for xyz_file in sorted(data.keys())[:5]:
+    assert np.allclose(K, K_test), "Error in FCHL multiquadratic kernels"
 
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
 
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
+def test_fchl_inverse_multiquadratic(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
     
     kernel_args = {
         "kernel": "inverse-multiquadratic",
@@ -773,54 +505,34 @@ def test_fchl_inverse_multiquadratic():
         },
     }
 
-    linear_kernel_args = {
-        "kernel": "linear",
-        "kernel_args": {
-            "c": [0.0],
-        },
-    }
-
 
     K = get_local_symmetric_kernels(X, **kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
+    K_test = np.zeros((len(X),len(X)))
 
-    for i, Xi in enumerate(X):
-        Sii = get_atomic_kernels(Xi[:mols[i].natoms], Xi[:mols[i].natoms], **linear_kernel_args)[0]
-        for j, Xj in enumerate(X):
+    c2 = kernel_args["kernel_args"]["c"][0]**2
 
-            Sjj = get_atomic_kernels(Xj[:mols[j].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
+    S = qm7_linear_kernel_blocks
 
-            for ii in range(Sii.shape[0]):
-                for jj in range(Sjj.shape[0]):
-
-                    l2 = Sii[ii,ii] + Sjj[jj,jj] - 2 * Sij[ii,jj]
-                    K_test[i,j] += 1.0 / np.sqrt(l2 + 4.0)
-    assert np.allclose(K, K_test), "Error in FCHL inverse multiquadratic kernels"
+    # Diagonals of the atomic self-kernels, needed for the l2 distances
+    S_diag = [np.diag(S[i][i]) for i in range(len(X))]
 
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
-def test_fchl_bessel():
+            Sij = S[i][j]
 
-    test_dir = os.path.dirname(os.path.realpath(__file__))
+            l2 = get_l2_distances(S_diag[i], S_diag[j], Sij)
+            K_test[i,j] = np.sum(1.0 / np.sqrt(l2 + c2))
+            K_test[j,i] = K_test[i,j]
 
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
+    assert np.allclose(K, K_test), "Error in FCHL inverse multiquadratic kernels"
 
-    for xyz_file in sorted(data.keys())[:5]:
 
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
+def test_fchl_bessel(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
-
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
     
     kernel_args = {
         "kernel": "bessel",
@@ -831,61 +543,34 @@ def test_fchl_bessel():
         },
     }
 
-    linear_kernel_args = {
-        "kernel": "linear",
-        "kernel_args": {
-            "c": [0.0],
-        },
-    }
-
 
     K = get_local_symmetric_kernels(X, **kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
+    K_test = np.zeros((len(X),len(X)))
 
     sigma = 2.0
     v = 3
     n = 2
 
 
-    for i, Xi in enumerate(X):
-        Sii = get_atomic_kernels(Xi[:mols[i].natoms], Xi[:mols[i].natoms], **linear_kernel_args)[0]
-        for j, Xj in enumerate(X):
-
-            Sjj = get_atomic_kernels(Xj[:mols[j].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
+    S = qm7_linear_kernel_blocks
 
-            for ii in range(Sii.shape[0]):
-                for jj in range(Sjj.shape[0]):
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
-                    l2 = np.sqrt(Sii[ii,ii] + Sjj[jj,jj] - 2 * Sij[ii,jj])
+            Sij = S[i][j]
 
-                    K_test[i,j] += jn(v, sigma * Sij[ii,jj])/ Sij[ii,jj]**(-n*(v+1))
+            K_test[i,j] = np.sum(jv(v, sigma * Sij) * Sij**(n*(v+1)))
+            K_test[j,i] = K_test[i,j]
 
     assert np.allclose(K, K_test), "Error in FCHL inverse bessel kernels"
 
 
-def test_fchl_l2():
-
-    test_dir = os.path.dirname(os.path.realpath(__file__))
+def test_fchl_l2(qm7_mols_fchl):
 
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
-
-    for xyz_file in sorted(data.keys())[:5]:
-
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
-
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
-
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
+    natoms = qm7_mols_fchl.natoms[:5]
     
     l2_kernel_args = {
         "kernel": "l2",
@@ -898,7 +583,7 @@ def test_fchl_l2():
 
     K = get_local_symmetric_kernels(X)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
+    K_test = np.zeros((len(X),len(X)))
 
     sigma = 2.0
     v = 3
@@ -906,42 +591,23 @@ def test_fchl_l2():
 
     inv_sigma = -1.0/ (2.0*2.5**2)
 
-    for i, Xi in enumerate(X):
-        for j, Xj in enumerate(X):
-
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms],
-                    **l2_kernel_args)[0]
+    S = get_atomic_kernel_blocks(X, natoms, l2_kernel_args)
 
-            for ii in range(Sij.shape[0]):
-                for jj in range(Sij.shape[1]):
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
+            Sij = S[i][j]
 
-                    K_test[i,j] += np.exp(Sij[ii,jj] * inv_sigma)
+            K_test[i,j] = np.sum(np.exp(Sij * inv_sigma))
+            K_test[j,i] = K_test[i,j]
 
     assert np.allclose(K, K_test), "Error in FCHL l2 kernels"
 
 
-def test_fchl_matern():
+def test_fchl_matern(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
-
-    for xyz_file in sorted(data.keys())[:5]:
-
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
-
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
-
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
     
     kernel_args = {
         "kernel": "matern",
@@ -951,66 +617,43 @@ def test_fchl_matern():
         },
     }
 
-    linear_kernel_args = {
-        "kernel": "linear",
-        "kernel_args": {
-            "c": [0.0],
-        },
-    }
-
 
     K = get_local_symmetric_kernels(X, **kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
+    K_test = np.zeros((len(X),len(X)))
 
     sigma = 5.0
     n = 2
     v = n + 0.5
 
+    # Coefficients of rho**(n-k), k = 0..n, of the Matern polynomial
+    facts = np.array([float(factorial(n+k)) / factorial(2*n) * binom(n,k) for k in range(0, n+1)])
 
-    for i, Xi in enumerate(X):
-        Sii = get_atomic_kernels(Xi[:mols[i].natoms], Xi[:mols[i].natoms], **linear_kernel_args)[0]
-        for j, Xj in enumerate(X):
+    S = qm7_linear_kernel_blocks
 
-            Sjj = get_atomic_kernels(Xj[:mols[j].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
+    # Diagonals of the atomic self-kernels, needed for the l2 distances
+    S_diag = [np.diag(S[i][i]) for i in range(len(X))]
 
-            for ii in range(Sii.shape[0]):
-                for jj in range(Sjj.shape[0]):
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
-                    l2 = np.sqrt(Sii[ii,ii] + Sjj[jj,jj] - 2 * Sij[ii,jj])
-                    
-                    rho = (2*np.sqrt(2*v)*l2/sigma)
+            Sij = S[i][j]
 
-                    for k in range(0, n+1):
-                        fact = float(factorial(n+k)) / factorial(2*n) * binom(n,k)
-                        K_test[i,j] += np.exp(-0.5 * rho) * fact * rho**(n-k)
+            l2 = np.sqrt(get_l2_distances(S_diag[i], S_diag[j], Sij))
 
+            rho = (2*np.sqrt(2*v)*l2/sigma)
 
-    assert np.allclose(K, K_test), "Error in FCHL matern kernels"
-
+            K_test[i,j] = np.sum(np.exp(-0.5 * rho) * np.polyval(facts, rho))
+            K_test[j,i] = K_test[i,j]
 
-def test_fchl_cauchy():
 
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
-
-    for xyz_file in sorted(data.keys())[:5]:
+    assert np.allclose(K, K_test), "Error in FCHL matern kernels"
 
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
 
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
+def test_fchl_cauchy(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
     
     kernel_args = {
         "kernel": "cauchy",
@@ -1019,55 +662,32 @@ def test_fchl_cauchy():
         },
     }
 
-    linear_kernel_args = {
-        "kernel": "linear",
-        "kernel_args": {
-            "c": [0.0],
-        },
-    }
-
 
     K = get_local_symmetric_kernels(X, **kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
+    K_test = np.zeros((len(X),len(X)))
 
-    for i, Xi in enumerate(X):
-        Sii = get_atomic_kernels(Xi[:mols[i].natoms], Xi[:mols[i].natoms], **linear_kernel_args)[0]
-        for j, Xj in enumerate(X):
-
-            Sjj = get_atomic_kernels(Xj[:mols[j].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
+    S = qm7_linear_kernel_blocks
 
-            for ii in range(Sii.shape[0]):
-                for jj in range(Sjj.shape[0]):
+    # Diagonals of the atomic self-kernels, needed for the l2 distances
+    S_diag = [np.diag(S[i][i]) for i in range(len(X))]
 
-                    l2 = Sii[ii,ii] + Sjj[jj,jj] - 2 * Sij[ii,jj]
-                    K_test[i,j] += 1.0 / (1.0 + l2/2.0**2)
-
-    assert np.allclose(K, K_test), "Error in FCHL cauchy kernels"
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
+            Sij = S[i][j]
 
-def test_fchl_polynomial2():
+            l2 = get_l2_distances(S_diag[i], S_diag[j], Sij)
+            K_test[i,j] = np.sum(1.0 / (1.0 + l2/2.0**2))
+            K_test[j,i] = K_test[i,j]
 
-    test_dir = os.path.dirname(os.path.realpath(__file__))
-
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenames
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects"
-    mols = []
-
-    for xyz_file in sorted(data.keys())[:5]:
+    assert np.allclose(K, K_test), "Error in FCHL cauchy kernels"
 
-        # Initialize the qml.Compound() objects
-        mol = Compound(xyz=test_dir + "/qm7/" + xyz_file)
 
-        # This is a Molecular Coulomb matrix sorted by row norm
-        mol.representation = generate_representation(mol.coordinates, \
-                                mol.nuclear_charges, cut_distance=1e6)
-        mols.append(mol)
+def test_fchl_polynomial2(qm7_mols_fchl, qm7_linear_kernel_blocks):
 
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_fchl.representations[:5]
     
     kernel_args = {
         "kernel": "polynomial2",
@@ -1076,50 +696,64 @@ def test_fchl_polynomial2():
         },
     }
 
-    linear_kernel_args = {
-        "kernel": "linear",
-        "kernel_args": {
-            "c": [0.0],
-        },
-    }
-
 
     K = get_local_symmetric_kernels(X, **kernel_args)[0]
 
-    K_test = np.zeros((len(mols),len(mols)))
+    K_test = np.zeros((len(X),len(X)))
 
-    for i, Xi in enumerate(X):
-        Sii = get_atomic_kernels(Xi[:mols[i].natoms], Xi[:mols[i].natoms], **linear_kernel_args)[0]
-        for j, Xj in enumerate(X):
+    S = qm7_linear_kernel_blocks
 
-            Sjj = get_atomic_kernels(Xj[:mols[j].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
-            Sij = get_atomic_kernels(Xi[:mols[i].natoms], Xj[:mols[j].natoms], **linear_kernel_args)[0]
+    for i in range(len(X)):
+        # The kernel is symmetric, so only the upper triangle is computed
+        for j in range(i, len(X)):
 
-            for ii in range(Sii.shape[0]):
-                for jj in range(Sjj.shape[0]):
+            Sij = S[i][j]
 
-                    K_test[i,j] += 1.0 + 2.0 * Sij[ii,jj] + 3.0 * Sij[ii,jj]**2
+            K_test[i,j] = np.sum(1.0 + 2.0 * Sij + 3.0 * Sij**2)
+            K_test[j,i] = K_test[i,j]
 
     assert np.allclose(K, K_test), "Error in FCHL polynomial2 kernels"
 
+def test_fchl_large_cutoff():
+
+    # The other tests use CUT_DISTANCE, which may be set lower,
+    # so always cover representations and kernels without a cut-off
+    qm7_mols_fchl = get_qm7_data(5, cut_distance=1e6)
+
+    X = qm7_mols_fchl.representations
+    natoms = qm7_mols_fchl.natoms
+
+    # Without a cut-off, every atom has all atoms of its molecule as neighbors
+    for i in range(len(X)):
+        assert np.all(np.sum(X[i,:natoms[i],0] < 1e6, axis=1) == natoms[i]), \
+            "Error in FCHL representation without cut-off"
+
+    K = get_local_kernels(X, X, cut_distance=1e6)[0]
+    K_symmetric = get_local_symmetric_kernels(X, cut_distance=1e6)[0]
+
+    assert np.allclose(K, K_symmetric), "Error in FCHL kernels without cut-off"
+
 if __name__ == "__main__":
 
+    qm7_mols_fchl = get_qm7_data()
+    qm7_linear_kernel_blocks = get_linear_kernel_blocks(qm7_mols_fchl)
+
     test_krr_fchl_local()
-    test_krr_fchl_global()
-    test_krr_fchl_atomic()
+    test_krr_fchl_global(qm7_mols_fchl)
+    test_krr_fchl_atomic(qm7_mols_fchl)
     test_fchl_local_periodic()
     
-    test_krr_fchl_alchemy()
+    test_krr_fchl_alchemy(qm7_mols_fchl)
     
     test_fchl_local_periodic()
-    test_fchl_alchemy()
-    test_fchl_linear()
-    test_fchl_polynomial()
-    test_fchl_sigmoid()
-    test_fchl_multiquadratic()
-    test_fchl_inverse_multiquadratic()
-    test_fchl_bessel()
-    test_fchl_l2()
-    test_fchl_matern()
-    test_fchl_cauchy()
-    test_fchl_polynomial2()
+    test_fchl_linear(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_polynomial(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_sigmoid(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_multiquadratic(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_inverse_multiquadratic(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_bessel(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_l2(qm7_mols_fchl)
+    test_fchl_matern(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_cauchy(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_polynomial2(qm7_mols_fchl, qm7_linear_kernel_blocks)
+    test_fchl_large_cutoff()
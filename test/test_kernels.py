@@ -27,11 +27,8 @@ import os
 import numpy as np
 import scipy
 from scipy.stats import wasserstein_distance
+from scipy.spatial.distance import cdist
 
-import sklearn
-from sklearn.decomposition import KernelPCA
-
-import qml
 from qml.kernels import wasserstein_kernel
 from qml.kernels import laplacian_kernel
 from qml.kernels import gaussian_kernel
@@ -42,25 +39,7 @@ from qml.kernels import matern_kernel
 from qml.kernels import sargan_kernel
 from qml.kernels import kpca
 
-def get_energies(filename):
-    """ Returns a dictionary with heats of formation for each xyz-file.
-    """
-
-    f = open(filename, "r")
-    lines = f.readlines()
-    f.close()
-
-    energies = dict()
-
-    for line in lines:
-        tokens = line.split()
-
-        xyz_name = tokens[0]
-        hof = float(tokens[1])
-
-        energies[xyz_name] = hof
-
-    return energies
+from qm7_data import get_qm7_bob
 
 def test_laplacian_kernel():
 
@@ -75,11 +54,8 @@ def test_laplacian_kernel():
 
     sigma = 100.0
 
-    Ktest = np.zeros((n_train, n_test))
-
-    for i in range(n_train):
-        for j in range(n_test):
-            Ktest[i,j] = np.exp( np.sum(np.abs(X[i] - Xs[j])) / (-1.0 * sigma))
+    D = cdist(X, Xs, "cityblock")
+    Ktest = np.exp(D / (-1.0 * sigma))
 
     K = laplacian_kernel(X, Xs, sigma)
 
@@ -109,11 +85,8 @@ def test_gaussian_kernel():
 
     sigma = 100.0
 
-    Ktest = np.zeros((n_train, n_test))
-
-    for i in range(n_train):
-        for j in range(n_test):
-            Ktest[i,j] = np.exp( np.sum(np.square(X[i] - Xs[j])) / (-2.0 * sigma**2))
+    D2 = cdist(X, Xs, "sqeuclidean")
+    Ktest = np.exp(D2 / (-2.0 * sigma**2))
 
     K = gaussian_kernel(X, Xs, sigma)
 
@@ -143,11 +116,7 @@ def test_linear_kernel():
 
     sigma = 100.0
 
-    Ktest = np.zeros((n_train, n_test))
-
-    for i in range(n_train):
-        for j in range(n_test):
-            Ktest[i,j] = np.dot(X[i], Xs[j])
+    Ktest = np.dot(X, Xs.T)
 
     K = linear_kernel(X, Xs)
 
@@ -178,24 +147,19 @@ def matern(metric, order):
 
     sigma = 100.0
 
-    Ktest = np.zeros((n_train, n_test))
-
-    for i in range(n_train):
-        for j in range(n_test):
+    if metric == "l1":
+        d = cdist(X, Xs, "cityblock")
+    else:
+        d = cdist(X, Xs, "euclidean")
 
-            if metric == "l1":
-                d = np.sum(abs(X[i] - Xs[j]))
-            else:
-                d = np.sqrt(np.sum((X[i] - Xs[j])**2))
-
-            if order == 0:
-                Ktest[i,j] = np.exp( - d / sigma)
-            elif order == 1:
-                Ktest[i,j] = np.exp( - np.sqrt(3) * d / sigma) \
-                    * (1 + np.sqrt(3) * d / sigma)
-            else:
-                Ktest[i,j] = np.exp( - np.sqrt(5) * d / sigma) \
-                    * (1 + np.sqrt(5) * d / sigma + 5.0/3 * d**2 / sigma**2)
+    if order == 0:
+        Ktest = np.exp( - d / sigma)
+    elif order == 1:
+        r = np.sqrt(3) / sigma * d
+        Ktest = np.exp(-r) * (1 + r)
+    else:
+        r = np.sqrt(5) / sigma * d
+        Ktest = np.exp(-r) * (1 + r + 5.0/(3 * sigma**2) * d**2)
 
     K = matern_kernel(X, Xs, sigma, metric = metric, order = order)
 
@@ -227,16 +191,13 @@ def sargan(ngamma):
 
     sigma = 100.0
 
-    Ktest = np.zeros((n_train, n_test))
+    d = cdist(X, Xs, "cityblock")
 
-    for i in range(n_train):
-        for j in range(n_test):
-            d = np.sum(abs(X[i] - Xs[j]))
+    factor = np.ones((n_train, n_test))
+    for k, gamma in enumerate(gammas):
+        factor += gamma / sigma**(k+1) * d ** (k+1)
 
-            factor = 1
-            for k, gamma in enumerate(gammas):
-                factor += gamma / sigma**(k+1) * d ** (k+1)
-            Ktest[i,j] = np.exp( - d / sigma) * factor
+    Ktest = np.exp( - d / sigma) * factor
 
     K = sargan_kernel(X, Xs, sigma, gammas)
 
@@ -256,35 +217,16 @@ def array_nan_close(a, b):
     return np.allclose(a[m], b[m], atol=1e-8, rtol=0.0)
 
 
-def test_kpca():
+def test_kpca(qm7_mols_bob):
 
     test_dir = os.path.dirname(os.path.realpath(__file__))
 
-    # Parse file containing PBE0/def2-TZVP heats of formation and xyz filenam
-    data = get_energies(test_dir + "/data/hof_qm7.txt")
-
-    # Generate a list of qml.Compound() objects
-    mols = []
-
-    keys = sorted(data.keys())
-
-    np.random.seed(666)
-    np.random.shuffle(keys)
-
-    n_mols = 100
-
-    for xyz_file in keys[:n_mols]:
-
-        mol = qml.Compound(xyz=test_dir + "/qm7/" + xyz_file)
-        mol.properties = data[xyz_file]
-        mol.generate_bob()
-        mols.append(mol)
-
-    X = np.array([mol.representation for mol in mols])
+    X = qm7_mols_bob
     K = laplacian_kernel(X, X, 2e5)
 
     pcas_qml = kpca(K, n=10)
-    pcas_sklearn = KernelPCA(10, eigen_solver="dense", kernel='precomputed').fit_transform(K)
+    # KernelPCA(10, eigen_solver="dense", kernel='precomputed').fit_transform(K) from scikit-learn
+    pcas_sklearn = np.load(test_dir + "/data/kpca_ref.npz")["pcas"]
 
     assert array_nan_close(np.abs(pcas_sklearn.T), np.abs(pcas_qml)), "Error in Kernel PCA decomposition."
 
@@ -296,16 +238,21 @@ def test_wasserstein_kernel():
     n_test = 3
 
     # List of dummy representations
-    X =  np.array(np.random.randint(0, 10, size=(n_train, 3)), dtype=np.float)
-    Xs = np.array(np.random.randint(0, 10, size=(n_test, 3)), dtype=np.float)
+    X =  np.array(np.random.randint(0, 10, size=(n_train, 3)), dtype=float)
+    Xs = np.array(np.random.randint(0, 10, size=(n_test, 3)), dtype=float)
 
     sigma = 100.0
 
-    Ktest = np.zeros((n_train, n_test))
+    # For two equally sized sets of samples with equal weights, the 1D Wasserstein
+    # distance is the mean absolute difference between the sorted samples
+    X_sorted = np.sort(X, axis=1)
+    Xs_sorted = np.sort(Xs, axis=1)
+
+    D = np.mean(np.abs(X_sorted[:,np.newaxis,:] - Xs_sorted[np.newaxis,:,:]), axis=2)
+
+    assert np.allclose(D[0,0], wasserstein_distance(X[0], Xs[0])), "Error in Wasserstein reference"
 
-    for i in range(n_train):
-        for j in range(n_test):
-            Ktest[i,j] = np.exp( wasserstein_distance(X[i], Xs[j]) / (-1.0 * sigma))
+    Ktest = np.exp(D / (-1.0 * sigma))
 
     K = wasserstein_kernel(X, Xs, sigma)
 
@@ -325,5 +272,5 @@ if __name__ == "__main__":
     test_matern_kernel()
     test_sargan_kernel()
     test_wasserstein_kernel()
-    test_kpca()
+    test_kpca(get_qm7_bob())
 
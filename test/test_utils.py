@@ -0,0 +1,125 @@
+# MIT License
+#
+# Copyright (c) 2018 Silvia Amabilino, Lars Andersen Bratholm
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from __future__ import print_function
+
+import numpy as np
+import pytest
+
+from qml.utils.utils import get_unique
+from qml.utils.utils import check_sizes
+from qml.utils.utils import is_bool
+from qml.utils.utils import get_pairs
+from qml.utils.utils import InputError
+
+def test_get_unique():
+
+    assert get_unique([[3, 1], [2, 1]]) == [1, 2, 3], "Error in get_unique"
+
+    # Empty sublists must not promote integers to floats
+    unique = get_unique([[1, 2], []])
+    assert unique == [1, 2], "Error in get_unique with an empty sublist"
+    assert all(isinstance(u, int) for u in unique), "get_unique changed the type of the elements"
+
+    assert get_unique([[], []]) == [], "Error in get_unique with empty input"
+    assert get_unique([["H", "C"], ["C"]]) == ["C", "H"], "Error in get_unique with strings"
+
+def test_check_sizes():
+
+    x_2d = np.zeros((4, 6))
+    x_3d = np.zeros((4, 5, 6))
+    y = np.zeros((4, 1))
+    dy = np.zeros((4, 5, 3))
+    classes = np.zeros((4, 5), dtype=int)
+
+    # Consistent sizes for every supported combination of (y, dy, classes)
+    check_sizes(x_3d, y=y)
+    check_sizes(x_3d, classes=classes)
+    check_sizes(x_3d, y=y, classes=classes)
+    check_sizes(x_3d, y=y, dy=dy, classes=classes)
+
+    # Only y
+    with pytest.raises(InputError, match="same first number of elements"):
+        check_sizes(x_3d, y=y[:3])
+
+    # Only classes
+    with pytest.raises(InputError, match="Different number of samples"):
+        check_sizes(x_3d, classes=classes[:3])
+    with pytest.raises(InputError, match="number of atoms in the descriptor"):
+        check_sizes(x_3d, classes=classes[:,:4])
+
+    # y and classes
+    with pytest.raises(InputError, match="All x, y and classes"):
+        check_sizes(x_3d, y=y, classes=classes[:3])
+    with pytest.raises(InputError, match="x and classes should have the same number"):
+        check_sizes(x_3d, y=y, classes=classes[:,:4])
+
+    # The number of atoms is only compared for 3D descriptors
+    check_sizes(x_2d, classes=classes[:,:4])
+    check_sizes(x_2d, y=y, classes=classes[:,:4])
+
+    # y, dy and classes
+    with pytest.raises(InputError, match="All x, y, dy and classes"):
+        check_sizes(x_3d, y=y, dy=dy[:3], classes=classes)
+    with pytest.raises(InputError, match="x, dy and classes should have the same number"):
+        check_sizes(x_3d, y=y, dy=dy[:,:4], classes=classes)
+
+    # Invalid combinations
+    with pytest.raises(InputError, match="Only x is not none"):
+        check_sizes(x_3d)
+    with pytest.raises(InputError, match="Unsupported combination"):
+        check_sizes(x_3d, y=y, dy=dy)
+    with pytest.raises(InputError, match="Unsupported combination"):
+        check_sizes(x_3d, dy=dy)
+    with pytest.raises(InputError, match="Unsupported combination"):
+        check_sizes(x_3d, dy=dy, classes=classes)
+
+def test_is_bool():
+
+    assert is_bool(True), "Error in is_bool"
+    assert is_bool(False), "Error in is_bool"
+    assert is_bool(np.bool_(True)), "is_bool should accept numpy booleans"
+
+    # Integers are not booleans, even if they are 0 or 1
+    assert not is_bool(0), "is_bool should reject 0"
+    assert not is_bool(1), "is_bool should reject 1"
+    assert not is_bool(None), "Error in is_bool"
+    assert not is_bool("True"), "Error in is_bool"
+
+def test_get_pairs():
+
+    assert get_pairs([1, 2, 3]) == [[1, 1], [1, 2], [1, 3], [2, 2], [2, 3], [3, 3]], "Error in get_pairs"
+    assert get_pairs([]) == [], "Error in get_pairs"
+
+    # Elements must be returned as they are, not converted to a common type
+    assert get_pairs([1, "a"]) == [[1, 1], [1, "a"], ["a", "a"]], "get_pairs changed mixed elements"
+
+    pairs = get_pairs([1, 2.5])
+    assert pairs == [[1, 1], [1, 2.5], [2.5, 2.5]], "Error in get_pairs"
+    assert type(pairs[0][0]) is int, "get_pairs converted an int to float"
+
+if __name__ == "__main__":
+
+    test_get_unique()
+    test_check_sizes()
+    test_is_bool()
+    test_get_pairs()